@@ -4,6 +4,7 @@ Configuration settings for the Love Story Generator
 
 import os
 from dotenv import load_dotenv
+from sqlalchemy import event
 
 class Config:
     """Configuration class for managing API keys and settings"""
@@ -20,10 +21,132 @@ class Config:
         self.max_tokens = 2000  # Increased for longer, more detailed stories
         self.temperature = 0.7  # Slightly lower for more consistent quality while maintaining creativity
         
+        # Log the cached prompt token counts OpenAI reports for each request
+        self.track_prompt_cache = os.getenv('TRACK_PROMPT_CACHE', '').lower() in ('1', 'true', 'yes')
+        
+        # Background generation workers and how long a webhook waits for its stories
+        self.generation_workers = int(os.getenv('GENERATION_WORKERS', '4'))
+        self.generation_wait_timeout = float(os.getenv('GENERATION_WAIT_TIMEOUT', '120'))
+        # Generation jobs one user or anonymous client IP may have running at once
+        self.generation_tenant_concurrency = int(os.getenv('GENERATION_TENANT_CONCURRENCY', '2'))
+        
+        # How long a form response ID is remembered to deduplicate webhook retries,
+        # and how long an unfinished claim blocks retries before they take it over
+        self.webhook_idempotency_ttl = int(os.getenv('WEBHOOK_IDEMPOTENCY_TTL', '86400'))
+        self.webhook_claim_lease = int(os.getenv('WEBHOOK_CLAIM_LEASE', '900'))
+        
+        # Database configuration
+        self.database_url = self._normalize_database_url(os.getenv('DATABASE_URL', 'sqlite:///love_stories.db'))
+        
+        # SQLite tuning, applied to every new connection
+        self.sqlite_busy_timeout_ms = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+        self.sqlite_cache_size_kb = int(os.getenv('SQLITE_CACHE_SIZE_KB', '16384'))
+        self.sqlite_mmap_size = int(os.getenv('SQLITE_MMAP_SIZE', str(128 * 1024 * 1024)))
+        
+        # Connection pool settings for server databases such as PostgreSQL
+        self.db_pool_size = int(os.getenv('DB_POOL_SIZE', '5'))
+        self.db_max_overflow = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+        self.db_pool_recycle = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+        
+        # Write-behind session analytics: flush every N seconds or after M events
+        self.session_flush_interval = float(os.getenv('SESSION_FLUSH_INTERVAL', '30'))
+        self.session_flush_events = int(os.getenv('SESSION_FLUSH_EVENTS', '500'))
+        self.session_buffer_max = int(os.getenv('SESSION_BUFFER_MAX', '10000'))
+        
+        # Number of reverse proxies in front of the app whose X-Forwarded-For is trusted;
+        # Railway (detected by its RAILWAY_ENVIRONMENT variable) adds one, elsewhere none
+        on_railway = bool(os.getenv('RAILWAY_ENVIRONMENT') or os.getenv('RAILWAY_ENVIRONMENT_NAME'))
+        self.trusted_proxy_hops = int(os.getenv('TRUSTED_PROXY_HOPS', '1' if on_railway else '0'))
+        
+        # Password hashing pool: concurrent hashes, and hashes allowed to run or wait
+        self.password_hash_workers = int(os.getenv('PASSWORD_HASH_WORKERS', '2'))
+        self.password_hash_max_pending = int(os.getenv('PASSWORD_HASH_MAX_PENDING', '16'))
+        
+        # Bearer token for the /admin endpoints, which are disabled when unset
+        self.admin_token = os.getenv('ADMIN_TOKEN', '')
+        
+        # Lazily loaded modules to import at startup instead, e.g. "openai,stripe,reportlab.platypus"
+        self.preload_modules = [name.strip() for name in os.getenv('PRELOAD_MODULES', '').split(',') if name.strip()]
+        
+        # Admission control for the generation webhooks (token buckets)
+        self.admission_ip_burst = int(os.getenv('ADMISSION_IP_BURST', '5'))
+        self.admission_ip_per_hour = float(os.getenv('ADMISSION_IP_PER_HOUR', '20'))
+        self.admission_plan_per_minute = float(os.getenv('ADMISSION_PLAN_PER_MINUTE', '60'))
+        self.admission_unlimited_burst = int(os.getenv('ADMISSION_UNLIMITED_BURST', '20'))
+        self.rate_limit_redis_url = os.getenv('RATE_LIMIT_REDIS_URL', '')
+        
+        # Browser cache lifetime for the precompressed static pages
+        self.static_max_age = int(os.getenv('STATIC_MAX_AGE', '3600'))
+        
+        # Stories kept in memory in front of the database and data/stories
+        self.story_hot_cache_size = int(os.getenv('STORY_HOT_CACHE_SIZE', '256'))
+        
+        # Rendered story pages kept in memory for repeat views
+        self.story_page_cache_size = int(os.getenv('STORY_PAGE_CACHE_SIZE', '1024'))
+        
+        # Seconds a cached story or page is trusted before it is reloaded, for edits made by other workers
+        self.story_cache_ttl = float(os.getenv('STORY_CACHE_TTL', '60'))
+        
+        # Exported story files kept in data/exports for repeat downloads
+        self.export_cache_max_files = int(os.getenv('EXPORT_CACHE_MAX_FILES', '1000'))
+        
         # Tally configuration (for future integration)
         self.tally_api_url = os.getenv('TALLY_API_URL', '')
         self.tally_api_key = os.getenv('TALLY_API_KEY', '')
+        # Signing secret of the Tally webhook; signed deliveries skip the per-IP limits
+        self.tally_signing_secret = os.getenv('TALLY_SIGNING_SECRET', '')
         
+        # Extra directory of <content_type>.txt prompt templates for the universal generator
+        self.prompt_templates_dir = os.getenv('PROMPT_TEMPLATES_DIR', '')
+        
+    @staticmethod
+    def _normalize_database_url(url):
+        """Accept the legacy postgres:// scheme some hosts still hand out"""
+        if url.startswith('postgres://'):
+            return 'postgresql://' + url[len('postgres://'):]
+        return url
+    
+    def is_sqlite(self):
+        """Check whether the configured database is SQLite"""
+        return self.database_url.startswith('sqlite')
+    
+    def sqlalchemy_engine_options(self):
+        """Engine options for SQLALCHEMY_ENGINE_OPTIONS, chosen from the database URL"""
+        if self.is_sqlite():
+            # Let the driver wait for locks too, not just the busy_timeout pragma
+            return {'connect_args': {'timeout': self.sqlite_busy_timeout_ms / 1000}}
+        
+        return {
+            'pool_size': self.db_pool_size,
+            'max_overflow': self.db_max_overflow,
+            'pool_recycle': self.db_pool_recycle,
+            'pool_pre_ping': True
+        }
+    
+    def sqlite_pragmas(self):
+        """Connect-time pragmas for SQLite connections"""
+        return [
+            ('journal_mode', 'WAL'),
+            ('synchronous', 'NORMAL'),
+            ('busy_timeout', self.sqlite_busy_timeout_ms),
+            ('mmap_size', self.sqlite_mmap_size),
+            ('cache_size', -self.sqlite_cache_size_kb),  # negative means KiB rather than pages
+        ]
+    
+    def configure_engine(self, engine):
+        """Install connect-time tuning on an engine created from ``database_url``"""
+        if engine.dialect.name != 'sqlite':
+            return
+        
+        pragmas = self.sqlite_pragmas()
+        
+        @event.listens_for(engine, 'connect')
+        def set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas:
+                cursor.execute(f"PRAGMA {name}={value}")
+            cursor.close()
+    
     def validate_config(self):
         """Validate that required configuration is present"""
         if not self.openai_api_key:
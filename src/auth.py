@@ -4,13 +4,33 @@ Authentication Module - Handles user login, registration, and account management
 
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify
 from flask_login import login_user, logout_user, login_required, current_user
-from werkzeug.security import generate_password_hash
 from src.user_models import db, User, Story
-from src.payments import PaymentProcessor
+from src.payments import payment_processor
+from src.pagination import keyset_paginate
+from src.user_cache import invalidate_user
+from src.password_hashing import HashingBusyError
+from src.rate_limit import LoginThrottle, SlidingWindowLimiter
+from src.sharing import publish_story, unpublish_story, release_snapshot
 import re
 
 auth = Blueprint('auth', __name__)
 
+# Failed logins per IP and username, and registrations per IP
+login_throttle = LoginThrottle()
+registration_limiter = SlidingWindowLimiter(limit=10, window_seconds=3600)
+
+BUSY_MESSAGE = 'We are handling a lot of requests right now. Please try again in a moment.'
+
+def _too_many_attempts(template, retry_after):
+    """Render a form again with a 429 and Retry-After"""
+    flash(f'Too many attempts. Please try again in {retry_after} seconds.', 'error')
+    return render_template(template), 429, {'Retry-After': str(retry_after)}
+
+def _hashing_busy(template):
+    """Render a form again with a 503 when the password hashing pool is saturated"""
+    flash(BUSY_MESSAGE, 'error')
+    return render_template(template), 503, {'Retry-After': '5'}
+
 @auth.route('/register', methods=['GET', 'POST'])
 def register():
     """User registration"""
@@ -33,6 +53,10 @@ def register():
             flash('Password must be at least 6 characters', 'error')
             return render_template('register.html')
         
+        retry_after = int(registration_limiter.retry_after(request.remote_addr or '') + 0.999)
+        if retry_after:
+            return _too_many_attempts('register.html', retry_after)
+        
         # Check if user already exists
         if User.query.filter_by(username=username).first():
             flash('Username already exists', 'error')
@@ -44,7 +68,11 @@ def register():
         
         # Create new user
         user = User(username=username, email=email)
-        user.set_password(password)
+        try:
+            user.set_password(password)
+        except HashingBusyError:
+            return _hashing_busy('register.html')
+        registration_limiter.hit(request.remote_addr or '')
         
         db.session.add(user)
         db.session.commit()
@@ -65,13 +93,25 @@ def login():
             flash('Please enter both username and password', 'error')
             return render_template('login.html')
         
+        ip = request.remote_addr or ''
+        retry_after = login_throttle.retry_after(ip, username)
+        if retry_after:
+            return _too_many_attempts('login.html', retry_after)
+        
         user = User.query.filter_by(username=username).first()
         
-        if user and user.check_password(password):
+        try:
+            valid = user is not None and user.check_password(password)
+        except HashingBusyError:
+            return _hashing_busy('login.html')
+        
+        if valid:
+            login_throttle.record_success(username)
             login_user(user)
             flash('Logged in successfully!', 'success')
             return redirect(url_for('home'))
         else:
+            login_throttle.record_failure(ip, username)
             flash('Invalid username or password', 'error')
     
     return render_template('login.html')
@@ -81,6 +121,7 @@ def login():
 def logout():
     """User logout"""
     logout_user()
+    session.pop('sid', None)
     flash('Logged out successfully!', 'success')
     return redirect(url_for('home'))
 
@@ -97,14 +138,66 @@ def account():
 @login_required
 def my_stories():
     """User's story history"""
-    page = request.args.get('page', 1, type=int)
-    stories = Story.query.filter_by(user_id=current_user.id)\
-                        .order_by(Story.created_at.desc())\
-                        .paginate(page=page, per_page=10, error_out=False)
+    stories = keyset_paginate(Story.query.filter_by(user_id=current_user.id), Story,
+                              per_page=10, cursor=request.args.get('cursor'))
     
     return render_template('my_stories.html', stories=stories)
 
+@auth.route('/account/stories.json')
+@login_required
+def my_stories_json():
+    """User's story history as JSON for infinite scroll"""
+    per_page = min(max(request.args.get('per_page', 10, type=int), 1), 50)
+    stories = keyset_paginate(Story.query.filter_by(user_id=current_user.id), Story,
+                              per_page=per_page, cursor=request.args.get('cursor'))
+    
+    return jsonify({
+        'stories': [{
+            'story_id': story.story_id,
+            'title': story.title,
+            'created_at': story.created_at.isoformat() if story.created_at else None,
+            'story_url': f'/story/{story.story_id}',
+            'share_url': f'/s/{story.share_key}' if story.share_key else None
+        } for story in stories.items],
+        'next_cursor': stories.next_cursor,
+        'prev_cursor': stories.prev_cursor
+    })
+
+@auth.route('/account/stories/<story_id>/share', methods=['POST'])
+@login_required
+def share_story(story_id):
+    """Publish a story under a public share link"""
+    story = Story.get_with_content(story_id)
+    if not story or story.user_id != current_user.id:
+        return "Story not found", 404
+    
+    if not current_user.can_share_stories():
+        flash('Story sharing is available on the Premium and Pro plans.', 'info')
+        return redirect(url_for('auth.upgrade'))
+    
+    previous_key = story.share_key
+    share_key = publish_story(story)
+    db.session.commit()
+    release_snapshot(previous_key)
+    
+    share_url = url_for('shared_story', share_key=share_key, _external=True)
+    flash(f'Your story is public at {share_url}', 'success')
+    return redirect(url_for('auth.my_stories'))
 
+@auth.route('/account/stories/<story_id>/unshare', methods=['POST'])
+@login_required
+def unshare_story(story_id):
+    """Take down a story's public share link"""
+    story = Story.query.filter_by(story_id=story_id, user_id=current_user.id).first()
+    if not story:
+        return "Story not found", 404
+    
+    share_key = unpublish_story(story)
+    db.session.commit()
+    release_snapshot(share_key)
+    
+    flash('Your story is no longer public.', 'info')
+    return redirect(url_for('auth.my_stories'))
 
 @auth.route('/account/settings', methods=['GET', 'POST'])
 @login_required
@@ -117,16 +210,25 @@ def settings():
         confirm_password = request.form.get('confirm_password')
         
         if current_password and new_password:
-            if not current_user.check_password(current_password):
-                flash('Current password is incorrect', 'error')
-            elif new_password != confirm_password:
-                flash('New passwords do not match', 'error')
-            elif len(new_password) < 6:
-                flash('New password must be at least 6 characters', 'error')
-            else:
-                current_user.set_password(new_password)
-                db.session.commit()
-                flash('Password updated successfully!', 'success')
+            ip = request.remote_addr or ''
+            retry_after = login_throttle.retry_after(ip, current_user.username)
+            try:
+                if retry_after:
+                    flash(f'Too many attempts. Please try again in {retry_after} seconds.', 'error')
+                elif not current_user.check_password(current_password):
+                    login_throttle.record_failure(ip, current_user.username)
+                    flash('Current password is incorrect', 'error')
+                elif new_password != confirm_password:
+                    flash('New passwords do not match', 'error')
+                elif len(new_password) < 6:
+                    flash('New password must be at least 6 characters', 'error')
+                else:
+                    current_user.set_password(new_password)
+                    db.session.commit()
+                    invalidate_user(current_user.id)
+                    flash('Password updated successfully!', 'success')
+            except HashingBusyError:
+                flash(BUSY_MESSAGE, 'error')
         
         # Handle email change
         new_email = request.form.get('email')
@@ -136,6 +238,7 @@ def settings():
             else:
                 current_user.email = new_email
                 db.session.commit()
+                invalidate_user(current_user.id)
                 flash('Email updated successfully!', 'success')
     
     return render_template('settings.html', user=current_user)
@@ -145,7 +248,6 @@ def settings():
 @login_required
 def upgrade():
     """Show upgrade plans"""
-    payment_processor = PaymentProcessor()
     plans = payment_processor.get_plans()
     return render_template('upgrade.html', plans=plans, user=current_user)
 
@@ -153,7 +255,6 @@ def upgrade():
 @login_required
 def subscribe(plan_type):
     """Start subscription process"""
-    payment_processor = PaymentProcessor()
     checkout_session_id = payment_processor.create_checkout_session(current_user, plan_type)
     
     if checkout_session_id:
@@ -181,7 +282,6 @@ def payment_cancel():
 @login_required
 def billing():
     """Manage billing and subscription"""
-    payment_processor = PaymentProcessor()
     portal_url = payment_processor.create_portal_session(current_user)
     
     if portal_url:
@@ -194,7 +294,6 @@ def billing():
 @login_required
 def cancel_subscription():
     """Cancel user subscription"""
-    payment_processor = PaymentProcessor()
     if payment_processor.cancel_subscription(current_user):
         flash('Your subscription will be cancelled at the end of the current billing period.', 'info')
     else:
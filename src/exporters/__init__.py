@@ -0,0 +1,33 @@
+"""
+Story Exporters - Parse a story once, write it as PDF, EPUB, DOCX, Markdown or plain text
+"""
+
+from typing import Dict, Optional
+from src.exporters.base import Exporter
+from src.exporters.cache import ExportCache
+from src.exporters.document import Block, StoryDocument, DocumentCache, document_cache, parse_story
+from src.exporters.docx import DocxExporter
+from src.exporters.epub import EpubExporter
+from src.exporters.markdown import MarkdownExporter
+from src.exporters.pdf import PDF_AVAILABLE, PdfExporter
+from src.exporters.text import TextExporter
+
+# Registered writers by format name; PDF needs reportlab
+EXPORTERS: Dict[str, Exporter] = {
+    exporter.format_name: exporter
+    for exporter in (
+        PdfExporter() if PDF_AVAILABLE else None,
+        EpubExporter(),
+        DocxExporter(),
+        MarkdownExporter(),
+        TextExporter()
+    )
+    if exporter is not None
+}
+
+# Format served by a plain download link
+DEFAULT_FORMAT = 'pdf' if PDF_AVAILABLE else 'txt'
+
+def get_exporter(format_name: str) -> Optional[Exporter]:
+    """Look up the writer for a format"""
+    return EXPORTERS.get(format_name)
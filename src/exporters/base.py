@@ -0,0 +1,37 @@
+"""
+Exporter Base - Interface shared by all story export formats
+"""
+
+import datetime
+from io import BytesIO
+from typing import BinaryIO
+from src.exporters.document import StoryDocument
+
+class Exporter:
+    """Writes a StoryDocument in one file format.
+
+    Subclasses set the format metadata and implement write().
+    """
+
+    format_name = ''
+    extension = ''
+    mimetype = 'application/octet-stream'
+
+    def write(self, document: StoryDocument, output: BinaryIO) -> None:
+        """Write the document to a binary file"""
+        raise NotImplementedError
+
+    def to_bytes(self, document: StoryDocument) -> bytes:
+        """Write the document into memory, for small outputs such as snapshots"""
+        buffer = BytesIO()
+        self.write(document, buffer)
+        return buffer.getvalue()
+
+    def filename(self, document: StoryDocument) -> str:
+        """Download file name for the document"""
+        return f'told_with_love_{document.story_id}.{self.extension}'
+
+    @staticmethod
+    def generated_on() -> str:
+        """Date printed in footers"""
+        return datetime.datetime.now().strftime('%B %d, %Y')
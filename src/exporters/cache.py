@@ -0,0 +1,57 @@
+"""
+Export Cache - Exported story files kept on disk for repeat downloads
+"""
+
+import os
+import re
+import tempfile
+import threading
+from src.exporters.base import Exporter
+from src.exporters.document import StoryDocument
+
+class ExportCache:
+    """Exported files on disk, keyed by document content and format.
+
+    Files are written straight to disk and renamed into place, so a
+    download can be served from the file without holding it in memory.
+    """
+
+    def __init__(self, root: str = os.path.join('data', 'exports'), max_files: int = 1000):
+        """Initialize the cache"""
+        self.root = os.path.abspath(root)
+        self.max_files = max_files
+        self._lock = threading.Lock()
+
+    def get_or_write(self, document: StoryDocument, exporter: Exporter) -> str:
+        """Path of the exported file, writing it on a miss"""
+        # The story ID is part of the name because some formats print it
+        story_id = re.sub(r'[^A-Za-z0-9_-]', '', document.story_id)[:50]
+        path = os.path.join(self.root, f'{story_id}-{document.key}.{exporter.extension}')
+        if os.path.isfile(path):
+            return path
+
+        os.makedirs(self.root, exist_ok=True)
+        fd, staging = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                exporter.write(document, f)
+            os.replace(staging, path)
+        except Exception:
+            os.unlink(staging)
+            raise
+
+        self._prune()
+        return path
+
+    def _prune(self) -> None:
+        """Delete the least recently written files beyond ``max_files``"""
+        with self._lock:
+            entries = [entry for entry in os.scandir(self.root) if not entry.name.endswith('.tmp')]
+            if len(entries) <= self.max_files:
+                return
+            entries.sort(key=lambda entry: entry.stat().st_mtime)
+            for entry in entries[:len(entries) - self.max_files]:
+                try:
+                    os.unlink(entry.path)
+                except OSError:
+                    pass
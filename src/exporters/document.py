@@ -0,0 +1,112 @@
+"""
+Story Document - Intermediate model every export format is written from
+"""
+
+import hashlib
+import json
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Tuple
+
+# Paragraphs opening with one of these are treated as dialogue
+DIALOGUE_OPENERS = ('"', '“', '«', '—')
+
+# Form fields shown as story details after the characters, in display order
+METADATA_FIELDS = (
+    ('setting', 'Setting'),
+    ('how_met', 'How they met'),
+    ('favorite_memory', 'Favorite memory'),
+    ('occasion', 'Occasion'),
+    ('submitted_at', 'Written on')
+)
+
+class Block(NamedTuple):
+    """One paragraph of the story body, ``kind`` is 'paragraph' or 'dialogue'"""
+    kind: str
+    text: str
+
+class StoryDocument(NamedTuple):
+    """A parsed story, immutable so it can be shared between requests and writers"""
+    key: str
+    story_id: str
+    title: str
+    blocks: Tuple[Block, ...]
+    metadata: Tuple[Tuple[str, str], ...]
+
+    @property
+    def characters(self) -> str:
+        """Character names joined for display, e.g. 'Ann & Ben'"""
+        return dict(self.metadata).get('Characters', '')
+
+def content_key(story_text: str, story_data: Dict) -> str:
+    """Hash of everything a document is built from"""
+    content = json.dumps({'text': story_text, 'data': story_data}, sort_keys=True, default=str)
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()[:32]
+
+def _clean(text: str) -> str:
+    """Strip markdown emphasis the model likes to add"""
+    return text.replace('**', '').replace('*', '').strip() if text else ''
+
+def _field(story_data: Dict, name: str) -> str:
+    """Form field value as display text"""
+    return str(story_data.get(name) or '').strip()
+
+def parse_story(story_id: str, story_text: str, story_data: Dict, key: Optional[str] = None) -> StoryDocument:
+    """Parse generated story text into a document.
+
+    The first line is the title, the rest is split into paragraphs on blank
+    lines.
+    """
+    lines = (story_text or '').strip().split('\n')
+    title = _clean(lines[0]) or 'A Love Story'
+    body = '\n'.join(lines[1:])
+
+    blocks = []
+    for paragraph in re.split(r'\n\s*\n', body):
+        text = ' '.join(line.strip() for line in paragraph.strip().split('\n')).replace('**', '')
+        if text:
+            blocks.append(Block('dialogue' if text.startswith(DIALOGUE_OPENERS) else 'paragraph', text))
+
+    metadata = []
+    characters = ' & '.join(filter(None, (_field(story_data, 'name1'), _field(story_data, 'name2'))))
+    if characters:
+        metadata.append(('Characters', characters))
+    for field, label in METADATA_FIELDS:
+        if _field(story_data, field):
+            metadata.append((label, _field(story_data, field)))
+
+    return StoryDocument(key or content_key(story_text, story_data), story_id, title, tuple(blocks), tuple(metadata))
+
+class DocumentCache:
+    """LRU cache of parsed documents keyed by story ID.
+
+    An entry is reused only while the story content hashes the same, so
+    edited stories are parsed again.
+    """
+
+    def __init__(self, max_size: int = 512):
+        """Initialize the cache"""
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, story_id: str, story_text: str, story_data: Dict) -> StoryDocument:
+        """Return the parsed document for a story, parsing it on a miss"""
+        key = content_key(story_text, story_data)
+        with self._lock:
+            document = self._entries.get(story_id)
+            if document is not None and document.key == key:
+                self._entries.move_to_end(story_id)
+                return document
+
+        document = parse_story(story_id, story_text, story_data, key)
+        with self._lock:
+            self._entries[story_id] = document
+            self._entries.move_to_end(story_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return document
+
+# Process-wide cache shared by downloads and share snapshots
+document_cache = DocumentCache()
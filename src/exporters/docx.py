@@ -0,0 +1,69 @@
+"""
+DOCX Exporter - Story as a Word document
+"""
+
+import zipfile
+from typing import BinaryIO
+from xml.sax.saxutils import escape
+from src.exporters.base import Exporter
+from src.exporters.document import StoryDocument
+
+CONTENT_TYPES_XML = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+  <Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+  <Default Extension="xml" ContentType="application/xml"/>
+  <Override PartName="/word/document.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>
+</Types>
+"""
+
+RELS_XML = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+  <Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="word/document.xml"/>
+</Relationships>
+"""
+
+WORD_NAMESPACE = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+
+class DocxExporter(Exporter):
+    """Writes the story as a minimal WordprocessingML package using only the standard library"""
+
+    format_name = 'docx'
+    extension = 'docx'
+    mimetype = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+    def write(self, document: StoryDocument, output: BinaryIO) -> None:
+        with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as package:
+            package.writestr('[Content_Types].xml', CONTENT_TYPES_XML)
+            package.writestr('_rels/.rels', RELS_XML)
+            package.writestr('word/document.xml', self._document_xml(document))
+
+    @staticmethod
+    def _paragraph(text: str, size: int = 24, bold: bool = False, italic: bool = False,
+                   center: bool = False, color: str = '2C3E50', indent: bool = False) -> str:
+        """One paragraph with a single run, ``size`` is in half-points"""
+        paragraph_props = '<w:spacing w:after="200" w:line="360" w:lineRule="auto"/>'
+        if center:
+            paragraph_props += '<w:jc w:val="center"/>'
+        if indent:
+            paragraph_props += '<w:ind w:firstLine="400"/>'
+        run_props = f'<w:color w:val="{color}"/><w:sz w:val="{size}"/>'
+        if bold:
+            run_props = '<w:b/>' + run_props
+        if italic:
+            run_props = '<w:i/>' + run_props
+        return (f'<w:p><w:pPr>{paragraph_props}</w:pPr>'
+                f'<w:r><w:rPr>{run_props}</w:rPr><w:t xml:space="preserve">{escape(text)}</w:t></w:r></w:p>')
+
+    def _document_xml(self, document: StoryDocument) -> str:
+        parts = [self._paragraph(document.title, size=48, bold=True, center=True, color='E91E63')]
+        for label, value in document.metadata:
+            parts.append(self._paragraph(f'{label}: {value}', size=20, color='7F8C8D'))
+        for block in document.blocks:
+            if block.kind == 'dialogue':
+                parts.append(self._paragraph(block.text, italic=True))
+            else:
+                parts.append(self._paragraph(block.text, indent=True))
+        parts.append(self._paragraph(f'Generated with love on {self.generated_on()}', size=18, center=True, color='6C757D'))
+
+        return (f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                f'<w:document xmlns:w="{WORD_NAMESPACE}"><w:body>{"".join(parts)}</w:body></w:document>')
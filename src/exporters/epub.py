@@ -0,0 +1,90 @@
+"""
+EPUB Exporter - Story as a single-chapter EPUB 3 book
+"""
+
+import datetime
+import zipfile
+from typing import BinaryIO
+from xml.sax.saxutils import escape
+from src.exporters.base import Exporter
+from src.exporters.document import StoryDocument
+
+CONTAINER_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+  <rootfiles>
+    <rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/>
+  </rootfiles>
+</container>
+"""
+
+STYLESHEET = """body { font-family: Georgia, serif; line-height: 1.6; }
+h1 { text-align: center; color: #e91e63; font-weight: normal; }
+.details { color: #7f8c8d; font-size: 0.9em; border-left: 3px solid #667eea; padding-left: 1em; }
+p { text-indent: 1.5em; margin: 0 0 0.8em 0; }
+p.dialogue { text-indent: 0; font-style: italic; }
+"""
+
+class EpubExporter(Exporter):
+    """Writes the story as an EPUB 3 file using only the standard library"""
+
+    format_name = 'epub'
+    extension = 'epub'
+    mimetype = 'application/epub+zip'
+
+    def write(self, document: StoryDocument, output: BinaryIO) -> None:
+        with zipfile.ZipFile(output, 'w') as book:
+            # The mimetype entry must come first and be stored uncompressed
+            book.writestr('mimetype', self.mimetype, compress_type=zipfile.ZIP_STORED)
+            book.writestr('META-INF/container.xml', CONTAINER_XML, compress_type=zipfile.ZIP_DEFLATED)
+            book.writestr('OEBPS/content.opf', self._package(document), compress_type=zipfile.ZIP_DEFLATED)
+            book.writestr('OEBPS/nav.xhtml', self._nav(document), compress_type=zipfile.ZIP_DEFLATED)
+            book.writestr('OEBPS/story.xhtml', self._chapter(document), compress_type=zipfile.ZIP_DEFLATED)
+            book.writestr('OEBPS/style.css', STYLESHEET, compress_type=zipfile.ZIP_DEFLATED)
+
+    def _package(self, document: StoryDocument) -> str:
+        modified = datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
+        creator = f'\n    <dc:creator>{escape(document.characters)}</dc:creator>' if document.characters else ''
+        return f"""<?xml version="1.0" encoding="UTF-8"?>
+<package xmlns="http://www.idpf.org/2007/opf" version="3.0" unique-identifier="book-id">
+  <metadata xmlns:dc="http://purl.org/dc/elements/1.1/">
+    <dc:identifier id="book-id">urn:told-with-love:{document.key}</dc:identifier>
+    <dc:title>{escape(document.title)}</dc:title>
+    <dc:language>en</dc:language>{creator}
+    <meta property="dcterms:modified">{modified}</meta>
+  </metadata>
+  <manifest>
+    <item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>
+    <item id="story" href="story.xhtml" media-type="application/xhtml+xml"/>
+    <item id="style" href="style.css" media-type="text/css"/>
+  </manifest>
+  <spine>
+    <itemref idref="story"/>
+  </spine>
+</package>
+"""
+
+    def _nav(self, document: StoryDocument) -> str:
+        return f"""<?xml version="1.0" encoding="UTF-8"?>
+<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops">
+<head><title>{escape(document.title)}</title></head>
+<body>
+  <nav epub:type="toc"><ol><li><a href="story.xhtml">{escape(document.title)}</a></li></ol></nav>
+</body>
+</html>
+"""
+
+    def _chapter(self, document: StoryDocument) -> str:
+        details = ''.join(f'<div><strong>{escape(label)}:</strong> {escape(value)}</div>' for label, value in document.metadata)
+        details = f'  <div class="details">{details}</div>\n' if details else ''
+        paragraphs = '\n'.join(
+            f'  <p class="{block.kind}">{escape(block.text)}</p>' for block in document.blocks
+        )
+        return f"""<?xml version="1.0" encoding="UTF-8"?>
+<html xmlns="http://www.w3.org/1999/xhtml">
+<head><title>{escape(document.title)}</title><link rel="stylesheet" href="style.css"/></head>
+<body>
+  <h1>{escape(document.title)}</h1>
+{details}{paragraphs}
+</body>
+</html>
+"""
@@ -0,0 +1,27 @@
+"""
+Markdown Exporter - Story as a .md file
+"""
+
+from typing import BinaryIO
+from src.exporters.base import Exporter
+from src.exporters.document import StoryDocument
+
+class MarkdownExporter(Exporter):
+    """Writes the story as Markdown with the details as a list"""
+
+    format_name = 'md'
+    extension = 'md'
+    mimetype = 'text/markdown'
+
+    def write(self, document: StoryDocument, output: BinaryIO) -> None:
+        lines = [f'# {document.title}', '']
+        if document.metadata:
+            lines.extend(f'- **{label}:** {value}' for label, value in document.metadata)
+            lines.append('')
+        for block in document.blocks:
+            # Keep paragraphs from turning into list items, headings or quotes
+            text = f'\\{block.text}' if block.text.startswith(('-', '+', '#', '>')) else block.text
+            lines.extend([text, ''])
+        lines.append(f'*Generated with love on {self.generated_on()}*')
+        lines.append('')
+        output.write('\n'.join(lines).encode('utf-8'))
@@ -0,0 +1,166 @@
+"""
+PDF Exporter - Story as a decorated PDF, requires reportlab
+"""
+
+import importlib.util
+from typing import BinaryIO
+from xml.sax.saxutils import escape
+from src.exporters.base import Exporter
+from src.exporters.document import StoryDocument
+from src.startup_report import lazy_import
+
+# reportlab is imported with the first PDF rather than at startup
+PDF_AVAILABLE = importlib.util.find_spec('reportlab') is not None
+
+# Helper function to safely create colors (defined globally)
+def safe_color(hex_code):
+    if not PDF_AVAILABLE:
+        return None
+    from reportlab.lib.colors import HexColor, Color
+    try:
+        return HexColor(hex_code)
+    except:
+        # Fallback to basic colors if HexColor fails
+        color_map = {
+            '#c44569': Color(0.77, 0.27, 0.41),  # Pink
+            '#667eea': Color(0.40, 0.49, 0.92),  # Blue
+            '#333333': Color(0.20, 0.20, 0.20),  # Dark gray
+            '#666666': Color(0.40, 0.40, 0.40),  # Gray
+            '#28a745': Color(0.16, 0.65, 0.27),  # Green
+        }
+        return color_map.get(hex_code, Color(0, 0, 0))  # Default to black
+
+def _pdf_text(text: str) -> str:
+    """Escape text for reportlab markup and swap emoji hearts for the font's heart"""
+    return escape(text).replace('💕', '♥').replace('❤️', '♥').replace('💖', '♥')
+
+class PdfExporter(Exporter):
+    """Writes the story as a PDF with the Told with Love layout"""
+
+    format_name = 'pdf'
+    extension = 'pdf'
+    mimetype = 'application/pdf'
+
+    def write(self, document: StoryDocument, output: BinaryIO) -> None:
+        lazy_import('reportlab.platypus')
+        from reportlab.lib.pagesizes import A4
+        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+        from reportlab.lib.colors import Color
+        from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_JUSTIFY
+        
+        doc = SimpleDocTemplate(output, pagesize=A4, rightMargin=50, leftMargin=50, topMargin=50, bottomMargin=50)
+        
+        # Create story elements
+        story_elements = []
+        
+        # Custom styles with better fonts and colors
+        styles = getSampleStyleSheet()
+        
+        # Enhanced title style with decorative elements
+        title_style = ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Heading1'],
+            fontSize=36,
+            spaceAfter=40,
+            alignment=TA_CENTER,
+            textColor=safe_color('#e91e63') or Color(0.91, 0.12, 0.39),  # Bright pink
+            fontName='Helvetica-Bold',
+            leading=40
+        )
+        
+        # Subtitle style for story details
+        subtitle_style = ParagraphStyle(
+            'CustomSubtitle',
+            parent=styles['Heading2'],
+            fontSize=16,
+            spaceAfter=25,
+            alignment=TA_CENTER,
+            textColor=safe_color('#3f51b5') or Color(0.25, 0.32, 0.71),  # Indigo
+            fontName='Helvetica-Bold',
+            leading=20
+        )
+        
+        # Enhanced story text style with better readability
+        story_style = ParagraphStyle(
+            'CustomStory',
+            parent=styles['Normal'],
+            fontSize=13,
+            spaceAfter=16,
+            alignment=TA_JUSTIFY,
+            textColor=safe_color('#2c3e50') or Color(0.17, 0.24, 0.31),  # Dark blue-gray
+            fontName='Helvetica',
+            leading=20,
+            firstLineIndent=20
+        )
+        
+        # Meta info style for story details
+        meta_style = ParagraphStyle(
+            'CustomMeta',
+            parent=styles['Normal'],
+            fontSize=11,
+            spaceAfter=10,
+            alignment=TA_LEFT,
+            textColor=safe_color('#7f8c8d') or Color(0.50, 0.55, 0.55),  # Gray
+            fontName='Helvetica'
+        )
+        
+        # Decorative header with proper heart symbols
+        header_text = "♥ Your Love Story ♥"
+        story_elements.append(Paragraph(header_text, title_style))
+        story_elements.append(Spacer(1, 20))
+        
+        # Display the creative title
+        story_elements.append(Paragraph(_pdf_text(document.title), subtitle_style))
+        story_elements.append(Spacer(1, 30))
+
+        # Add decorative separator
+        separator_style = ParagraphStyle(
+            'Separator',
+            parent=styles['Normal'],
+            fontSize=16,
+            alignment=TA_CENTER,
+            textColor=safe_color('#e91e63') or Color(0.91, 0.12, 0.39),
+            spaceAfter=20,
+            spaceBefore=20
+        )
+        story_elements.append(Paragraph("♥ ♥ ♥", separator_style))
+        story_elements.append(Spacer(1, 20))
+
+        # Dialogue is set in italics without the first-line indent
+        dialogue_style = ParagraphStyle(
+            'CustomDialogue',
+            parent=story_style,
+            fontName='Helvetica-Oblique',
+            firstLineIndent=0
+        )
+        
+        # Add the full story text
+        for block in document.blocks:
+            style = dialogue_style if block.kind == 'dialogue' else story_style
+            story_elements.append(Paragraph(_pdf_text(block.text), style))
+            story_elements.append(Spacer(1, 16))
+        
+        # Add footer with decorative elements
+        footer_style = ParagraphStyle(
+            'Footer',
+            parent=styles['Normal'],
+            fontSize=10,
+            alignment=TA_CENTER,
+            textColor=safe_color('#6c757d') or Color(0.42, 0.46, 0.49),
+            spaceBefore=30
+        )
+        
+        footer_text = f"♥ Generated with love on {self.generated_on()} ♥"
+        story_elements.append(Paragraph(footer_text, footer_style))
+        
+        # Build PDF
+        def add_loving_background(canvas, doc):
+            canvas.saveState()
+            # Very light pink background that won't interfere with text
+            canvas.setFillColor(safe_color('#fef7f9') or Color(0.996, 0.969, 0.976))
+            canvas.rect(0, 0, A4[0], A4[1], fill=1, stroke=0)
+            canvas.restoreState()
+
+        doc.build(story_elements, onFirstPage=add_loving_background, onLaterPages=add_loving_background)
+        
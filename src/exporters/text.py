@@ -0,0 +1,29 @@
+"""
+Plain Text Exporter - Story as a .txt file, also the download fallback without reportlab
+"""
+
+from typing import BinaryIO
+from src.exporters.base import Exporter
+from src.exporters.document import StoryDocument
+
+class TextExporter(Exporter):
+    """Writes the story as UTF-8 plain text"""
+
+    format_name = 'txt'
+    extension = 'txt'
+    mimetype = 'text/plain'
+
+    def write(self, document: StoryDocument, output: BinaryIO) -> None:
+        lines = ['TOLD WITH LOVE', '']
+        lines.extend(f'{label}: {value}' for label, value in document.metadata)
+        lines.extend(['', document.title.upper(), ''])
+        for block in document.blocks:
+            lines.extend([block.text, ''])
+        lines.extend([
+            '---',
+            'This love story was created with love by Told with Love',
+            f'Generated on {self.generated_on()}',
+            f'Story ID: {document.story_id}',
+            ''
+        ])
+        output.write('\n'.join(lines).encode('utf-8'))
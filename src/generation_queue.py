@@ -0,0 +1,234 @@
+"""
+Generation Queue - Runs story generation jobs on background worker threads
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Callable, Dict, Iterable, Mapping, Optional
+from src.plans import PLAN_PRIORITY_WEIGHTS
+
+# Tier of jobs submitted without one
+DEFAULT_TIER = 'anonymous'
+
+class GenerationJob:
+    """A single queued generation job and its current status"""
+
+    def __init__(self, job_id: str, func: Callable, args: tuple, tier: str = DEFAULT_TIER, tenant: Optional[str] = None):
+        """Initialize the job"""
+        self.job_id = job_id
+        self.tier = tier
+        self.tenant = tenant
+        self.status = 'queued'  # queued, generating, done, failed
+        self.result = None
+        self.error = None
+        self.enqueued_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._func = func
+        self._args = args
+        self._finished = threading.Event()
+
+    def run(self):
+        """Run the job and record its outcome"""
+        self.status = 'generating'
+        self.started_at = time.time()
+        try:
+            self.result = self._func(*self._args)
+            self.status = 'done'
+        except Exception as e:
+            self.error = str(e)
+            self.status = 'failed'
+            print(f"Error running generation job {self.job_id}: {e}")
+        finally:
+            self.finished_at = time.time()
+            self._finished.set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait for the job to finish, returns False on timeout"""
+        return self._finished.wait(timeout)
+
+    def is_finished(self) -> bool:
+        """Check whether the job has finished, successfully or not"""
+        return self._finished.is_set()
+
+    def to_dict(self) -> Dict:
+        """Serialize the job status for JSON responses"""
+        data = {'job_id': self.job_id, 'status': self.status}
+        if self.result:
+            data.update(self.result)
+        if self.error:
+            data['error'] = self.error
+        return data
+
+class TierStats:
+    """Queue-wait statistics of one tier over its most recent jobs"""
+
+    def __init__(self, window: int = 500):
+        """Initialize the stats"""
+        self.started = 0
+        self.max_wait = 0.0
+        self._waits = deque(maxlen=window)
+
+    def record(self, wait: float) -> None:
+        """Record how long a job waited before starting"""
+        self.started += 1
+        self.max_wait = max(self.max_wait, wait)
+        self._waits.append(wait)
+
+    def to_dict(self) -> Dict:
+        """Summarize the recent waits in seconds"""
+        waits = sorted(self._waits)
+        if not waits:
+            return {'started': self.started, 'wait_avg': 0, 'wait_p50': 0, 'wait_p95': 0, 'wait_max': 0}
+        return {
+            'started': self.started,
+            'wait_avg': round(sum(waits) / len(waits), 3),
+            'wait_p50': round(waits[len(waits) // 2], 3),
+            'wait_p95': round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 3),
+            'wait_max': round(self.max_wait, 3)
+        }
+
+class GenerationQueue:
+    """Queues generation jobs and runs them on a fixed pool of worker threads.
+
+    Jobs wait in one queue per tier and are dispatched by weighted fair
+    queuing (stride scheduling): while several tiers have jobs waiting,
+    each gets workers in proportion to its weight, so higher plans see
+    shorter waits and lower plans still progress. A tenant (a user or
+    client IP) never has more than ``max_per_tenant`` jobs running at once.
+    """
+
+    def __init__(self, workers: int = 4, max_tracked_jobs: int = 1000, app=None,
+                 tier_weights: Mapping[str, float] = PLAN_PRIORITY_WEIGHTS, max_per_tenant: Optional[int] = None):
+        """Initialize the queue, workers are started on the first submission.
+
+        When a Flask ``app`` is given every job runs inside its app context.
+        """
+        self.workers = workers
+        self.app = app
+        self.max_tracked_jobs = max_tracked_jobs
+        self.tier_weights = tier_weights
+        self.max_per_tenant = max_per_tenant
+        self._pending: Dict[str, deque] = {}
+        self._pass: Dict[str, float] = {}
+        self._running: Dict[str, int] = {}
+        self._stats: Dict[str, TierStats] = {}
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._work_available = threading.Condition(self._lock)
+        self._threads = []
+
+    def submit(self, func: Callable, *args, tier: str = DEFAULT_TIER, tenant: Optional[str] = None) -> GenerationJob:
+        """Enqueue ``func(*args)`` as a new job of ``tier`` on behalf of ``tenant``"""
+        job = GenerationJob(uuid.uuid4().hex, func, args, tier, tenant)
+
+        with self._lock:
+            self._start_workers()
+            self._jobs[job.job_id] = job
+            self._evict_finished_jobs()
+
+            queue = self._pending.get(tier)
+            if not queue:
+                # A tier that was idle rejoins at the current pass, so it cannot bank credit
+                active = [self._pass[name] for name, jobs in self._pending.items() if jobs]
+                self._pass[tier] = max(self._pass.get(tier, 0.0), min(active, default=0.0))
+                queue = self._pending.setdefault(tier, deque())
+            queue.append(job)
+            self._work_available.notify()
+
+        return job
+
+    def get(self, job_id: str) -> Optional[GenerationJob]:
+        """Look up a job by ID"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def wait_all(self, jobs: Iterable[GenerationJob], timeout: Optional[float] = None) -> bool:
+        """Wait for all jobs to finish within a shared timeout"""
+        deadline = None if timeout is None else time.time() + timeout
+        for job in jobs:
+            remaining = None if deadline is None else max(0, deadline - time.time())
+            if not job.wait(remaining):
+                return False
+        return True
+
+    def metrics(self) -> Dict:
+        """Queue depth and recent queue-wait times per tier"""
+        with self._lock:
+            now = time.time()
+            tiers = {}
+            for tier in set(self._pending) | set(self._stats):
+                queue = self._pending.get(tier) or ()
+                tiers[tier] = {
+                    'weight': self._weight(tier),
+                    'queued': len(queue),
+                    'oldest_wait': round(now - queue[0].enqueued_at, 3) if queue else 0,
+                    **(self._stats[tier].to_dict() if tier in self._stats else TierStats().to_dict())
+                }
+            return {
+                'workers': self.workers,
+                'running': sum(self._running.values()),
+                'max_per_tenant': self.max_per_tenant,
+                'tiers': tiers
+            }
+
+    def _weight(self, tier: str) -> float:
+        return self.tier_weights.get(tier, self.tier_weights.get(DEFAULT_TIER, 1))
+
+    def _next_job(self) -> Optional[GenerationJob]:
+        """Pop the next job to run, the caller holds the lock"""
+        for tier in sorted((tier for tier, jobs in self._pending.items() if jobs), key=lambda tier: self._pass[tier]):
+            queue = self._pending[tier]
+            for index, job in enumerate(queue):
+                if self._tenant_has_capacity(job.tenant):
+                    del queue[index]
+                    self._pass[tier] += 1 / self._weight(tier)
+                    if job.tenant is not None:
+                        self._running[job.tenant] = self._running.get(job.tenant, 0) + 1
+                    self._stats.setdefault(tier, TierStats()).record(time.time() - job.enqueued_at)
+                    return job
+        return None
+
+    def _tenant_has_capacity(self, tenant: Optional[str]) -> bool:
+        return tenant is None or self.max_per_tenant is None or self._running.get(tenant, 0) < self.max_per_tenant
+
+    def _start_workers(self):
+        """Start the worker threads if they are not running yet"""
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._worker, name=f'generation-worker-{len(self._threads)}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _evict_finished_jobs(self):
+        """Forget the oldest finished jobs once too many are tracked"""
+        if len(self._jobs) <= self.max_tracked_jobs:
+            return
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.is_finished()]:
+            del self._jobs[job_id]
+            if len(self._jobs) <= self.max_tracked_jobs:
+                break
+
+    def _worker(self):
+        """Worker loop, runs jobs until the process exits"""
+        while True:
+            with self._lock:
+                job = self._next_job()
+                while job is None:
+                    self._work_available.wait()
+                    job = self._next_job()
+            try:
+                if self.app is not None:
+                    with self.app.app_context():
+                        job.run()
+                else:
+                    job.run()
+            finally:
+                if job.tenant is not None:
+                    with self._lock:
+                        self._running[job.tenant] -= 1
+                        if not self._running[job.tenant]:
+                            del self._running[job.tenant]
+                        # A capped tenant's next job may be runnable now
+                        self._work_available.notify_all()
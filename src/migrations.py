@@ -0,0 +1,140 @@
+"""
+Database Migrations - Versioned schema changes for existing databases
+"""
+
+from datetime import datetime
+from typing import Callable, List
+from sqlalchemy.exc import IntegrityError
+from src.user_models import db, CompressedText
+
+# Applied migration versions, one row per migration
+schema_migrations = db.Table(
+    'schema_migrations',
+    db.Column('version', db.Integer, primary_key=True),
+    db.Column('description', db.String(200)),
+    db.Column('applied_at', db.DateTime, default=datetime.utcnow)
+)
+
+# Registered migrations as (version, description, function) in version order
+MIGRATIONS = []
+
+def migration(version: int, description: str) -> Callable:
+    """Register a migration function taking an open connection"""
+    def register(func: Callable) -> Callable:
+        MIGRATIONS.append((version, description, func))
+        MIGRATIONS.sort(key=lambda entry: entry[0])
+        return func
+    return register
+
+def _add_missing_columns(connection, table_name: str, column_names: List[str]) -> None:
+    """Add model-declared columns that an older database is missing"""
+    table = db.metadata.tables[table_name]
+    existing = {column['name'] for column in db.inspect(connection).get_columns(table_name)}
+    preparer = connection.dialect.identifier_preparer
+    
+    for name in column_names:
+        if name in existing:
+            continue
+        column = table.c[name]
+        column_type = column.type.compile(dialect=connection.dialect)
+        connection.execute(db.text(
+            f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {preparer.format_column(column)} {column_type}"
+        ))
+
+def _create_indexes(connection, table_name: str, index_names: List[str]) -> None:
+    """Create model-declared indexes that an older database is missing"""
+    table = db.metadata.tables[table_name]
+    for index in table.indexes:
+        if index.name in index_names:
+            index.create(connection, checkfirst=True)
+
+@migration(1, 'Add the Stripe columns to user')
+def _add_user_stripe_columns(connection):
+    _add_missing_columns(connection, 'user', ['stripe_customer_id', 'stripe_subscription_id'])
+
+@migration(2, 'Index the hot Story, User and UserSession lookups')
+def _add_hot_query_indexes(connection):
+    _create_indexes(connection, 'story', ['ix_story_user_id_created_at'])
+    _create_indexes(connection, 'user', ['ix_user_stripe_customer_id', 'ix_user_stripe_subscription_id'])
+    _create_indexes(connection, 'user_session', ['ix_user_session_user_id'])
+
+@migration(3, 'Store story.story_text as compressed binary')
+def _compress_story_text_column(connection):
+    # SQLite keeps the BLOB values in the existing TEXT column as-is; other
+    # databases need a binary column. Rows are compressed by backfill_story_text().
+    if connection.dialect.name != 'postgresql':
+        return
+    # Fresh databases already get BYTEA from create_all()
+    columns = {column['name']: column['type'] for column in db.inspect(connection).get_columns('story')}
+    if isinstance(columns.get('story_text'), (db.Text, db.String)):
+        connection.execute(db.text(
+            "ALTER TABLE story ALTER COLUMN story_text TYPE BYTEA USING convert_to(story_text, 'UTF8')"
+        ))
+
+@migration(4, 'Add the share link key to story')
+def _add_story_share_key(connection):
+    _add_missing_columns(connection, 'story', ['share_key'])
+
+def backfill_story_text(batch_size: int = 500) -> int:
+    """Compress story_text for rows written before compression, returns the number converted"""
+    story = db.metadata.tables['story']
+    converted = 0
+    last_id = 0
+    
+    while True:
+        # Read the raw column values so legacy rows can be told apart
+        rows = db.session.execute(
+            db.text("SELECT id, story_text FROM story WHERE id > :last_id ORDER BY id LIMIT :limit"),
+            {'last_id': last_id, 'limit': batch_size}
+        ).all()
+        if not rows:
+            break
+        
+        last_id = rows[-1].id
+        updates = [
+            {'row_id': row.id, 'text': row.story_text if isinstance(row.story_text, str) else CompressedText.decompress(bytes(row.story_text))}
+            for row in rows
+            if row.story_text is not None and not CompressedText.is_compressed(row.story_text)
+        ]
+        if updates:
+            db.session.execute(
+                story.update().where(story.c.id == db.bindparam('row_id')).values(story_text=db.bindparam('text')),
+                updates
+            )
+            db.session.commit()
+            converted += len(updates)
+    
+    return converted
+
+def upgrade_database() -> List[int]:
+    """Create missing tables and apply pending migrations, returns the applied versions.
+
+    Must be called inside an app context. Migrations are idempotent, so
+    several workers upgrading at the same time is safe.
+    """
+    db.create_all()
+    
+    applied = []
+    with db.engine.begin() as connection:
+        done = {row.version for row in connection.execute(db.select(schema_migrations.c.version))}
+        
+        for version, description, func in MIGRATIONS:
+            if version in done:
+                continue
+            
+            func(connection)
+            try:
+                with connection.begin_nested():
+                    connection.execute(schema_migrations.insert().values(
+                        version=version,
+                        description=description,
+                        applied_at=datetime.utcnow()
+                    ))
+            except IntegrityError:
+                # Another worker recorded this migration first
+                pass
+            
+            applied.append(version)
+            print(f"Applied migration {version}: {description}")
+    
+    return applied
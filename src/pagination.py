@@ -0,0 +1,83 @@
+"""
+Keyset Pagination - Cursor-based paging over (created_at, id), newest first
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import List, Optional, Tuple
+from src.user_models import db
+
+class KeysetPage:
+    """One page of results with opaque cursors to its neighbours"""
+
+    def __init__(self, items: List, next_cursor: Optional[str], prev_cursor: Optional[str]):
+        """Initialize the page"""
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self) -> bool:
+        return self.prev_cursor is not None
+
+def encode_cursor(direction: str, created_at: datetime, row_id: int) -> str:
+    """Encode a position as an opaque cursor, ``direction`` is 'after' or 'before'"""
+    raw = json.dumps([direction, created_at.isoformat(), row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor: str) -> Tuple[str, datetime, int]:
+    """Decode a cursor, raises ValueError if it is malformed"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        direction, created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if direction not in ('after', 'before'):
+            raise ValueError(direction)
+        return direction, datetime.fromisoformat(created_at), int(row_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+def keyset_paginate(query, model, per_page: int = 10, cursor: Optional[str] = None) -> KeysetPage:
+    """Fetch one page of ``query`` ordered by ``(model.created_at, model.id)`` descending.
+
+    Only ``per_page + 1`` rows are read and no total count is taken. Invalid
+    cursors fall back to the first page.
+    """
+    position = None
+    if cursor:
+        try:
+            position = decode_cursor(cursor)
+        except ValueError:
+            position = None
+
+    key = db.tuple_(model.created_at, model.id)
+
+    if position and position[0] == 'before':
+        # Walk backwards towards newer rows, then restore newest-first order
+        _, created_at, row_id = position
+        rows = query.filter(key > db.tuple_(created_at, row_id))\
+                    .order_by(model.created_at.asc(), model.id.asc())\
+                    .limit(per_page + 1).all()
+        has_prev = len(rows) > per_page
+        items = list(reversed(rows[:per_page]))
+        has_next = True
+    else:
+        if position:
+            _, created_at, row_id = position
+            query = query.filter(key < db.tuple_(created_at, row_id))
+        rows = query.order_by(model.created_at.desc(), model.id.desc())\
+                    .limit(per_page + 1).all()
+        has_next = len(rows) > per_page
+        items = rows[:per_page]
+        has_prev = position is not None
+
+    if not items:
+        return KeysetPage([], None, None)
+
+    next_cursor = encode_cursor('after', items[-1].created_at, items[-1].id) if has_next else None
+    prev_cursor = encode_cursor('before', items[0].created_at, items[0].id) if has_prev else None
+    return KeysetPage(items, next_cursor, prev_cursor)
@@ -0,0 +1,58 @@
+"""
+Password Hashing - Runs password hashing on a small, bounded worker pool
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from werkzeug.security import generate_password_hash, check_password_hash
+
+class HashingBusyError(RuntimeError):
+    """Raised when too many password hashes are already waiting"""
+
+class PasswordHasher:
+    """Caps how much CPU password hashing can take from the request workers.
+
+    At most ``workers`` hashes run at once and at most ``max_pending`` may
+    be running or queued; beyond that callers get HashingBusyError instead
+    of piling up behind a credential-stuffing burst.
+    """
+    
+    def __init__(self, workers: int = 2, max_pending: int = 16, timeout: float = 10):
+        """Initialize the hasher"""
+        self.timeout = timeout
+        self.configure(workers, max_pending)
+    
+    def configure(self, workers: int, max_pending: int) -> None:
+        """Resize the pool, call at startup before any password is hashed"""
+        previous = getattr(self, '_executor', None)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        self._slots = threading.BoundedSemaphore(max_pending)
+        if previous is not None:
+            previous.shutdown(wait=False)
+    
+    def hash(self, password: str) -> str:
+        """Hash a password"""
+        return self._run(generate_password_hash, password)
+    
+    def verify(self, password_hash: str, password: str) -> bool:
+        """Check a password against its hash"""
+        return self._run(check_password_hash, password_hash, password)
+    
+    def _run(self, func, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HashingBusyError("Too many password checks in progress")
+        
+        try:
+            future = self._executor.submit(func, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise HashingBusyError("Password check timed out")
+
+# Process-wide hasher used by the User model, sized from Config at startup
+password_hasher = PasswordHasher()
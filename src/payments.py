@@ -2,43 +2,40 @@
 Payment Processing Module - Handles Stripe integration for subscriptions
 """
 
-import stripe
 import os
+import threading
 from datetime import datetime, timedelta
-from typing import Dict, Optional
-from src.user_models import db, User
+from typing import Dict, List, Mapping, Optional
+from sqlalchemy.exc import IntegrityError
+from src.user_models import db, User, StripeEvent
+from src.plans import get_plan_catalog
+from src.user_cache import invalidate_user
+from src.startup_report import lazy_import
 
-# Initialize Stripe
-stripe.api_key = os.environ.get('STRIPE_SECRET_KEY')
+_stripe_lock = threading.Lock()
+_stripe_configured = False
+
+def get_stripe():
+    """The Stripe SDK, imported and configured on first use rather than at startup"""
+    global _stripe_configured
+    stripe = lazy_import('stripe')
+    if not _stripe_configured:
+        with _stripe_lock:
+            if not _stripe_configured:
+                stripe.api_key = os.environ.get('STRIPE_SECRET_KEY')
+                # Point at a local Stripe stand-in (e.g. stripe-mock) for testing
+                if os.environ.get('STRIPE_API_BASE'):
+                    stripe.api_base = os.environ['STRIPE_API_BASE']
+                _stripe_configured = True
+    return stripe
 
 class PaymentProcessor:
     """Handles payment processing and subscription management"""
     
-    def __init__(self):
-        """Initialize the payment processor"""
-        self.plans = {
-            'basic': {
-                'name': 'Basic Plan',
-                'price_id': os.environ.get('STRIPE_BASIC_PRICE_ID'),
-                'stories_per_month': 3,
-                'price': 4.99,
-                'features': ['3 stories per month', 'High-quality PDFs', 'Story history']
-            },
-            'premium': {
-                'name': 'Premium Plan',
-                'price_id': os.environ.get('STRIPE_PREMIUM_PRICE_ID'),
-                'stories_per_month': 10,
-                'price': 9.99,
-                'features': ['10 stories per month', 'Premium PDF themes', 'Priority support', 'Story sharing']
-            },
-            'pro': {
-                'name': 'Pro Plan',
-                'price_id': os.environ.get('STRIPE_PRO_PRICE_ID'),
-                'stories_per_month': -1,  # Unlimited
-                'price': 19.99,
-                'features': ['Unlimited stories', 'All premium themes', 'API access', 'Bulk generation', 'White-label options']
-            }
-        }
+    @property
+    def plans(self) -> Mapping[str, Mapping]:
+        """Available paid plans, from the process-wide catalog"""
+        return get_plan_catalog()
     
     def create_checkout_session(self, user: User, plan_type: str) -> Optional[str]:
         """Create a Stripe checkout session for subscription"""
@@ -48,7 +45,7 @@ class PaymentProcessor:
             
             plan = self.plans[plan_type]
             
-            checkout_session = stripe.checkout.Session.create(
+            checkout_session = get_stripe().checkout.Session.create(
                 customer_email=user.email,
                 line_items=[{
                     'price': plan['price_id'],
@@ -69,74 +66,115 @@ class PaymentProcessor:
             print(f"Error creating checkout session: {e}")
             return None
     
-    def handle_webhook(self, payload: bytes, sig_header: str) -> bool:
-        """Handle Stripe webhook events"""
+    def construct_event(self, payload: bytes, sig_header: str):
+        """Verify a Stripe webhook signature and parse the event, raises on a bad signature"""
+        webhook_secret = os.environ.get('STRIPE_WEBHOOK_SECRET')
+        return get_stripe().Webhook.construct_event(payload, sig_header, webhook_secret)
+    
+    def record_event(self, event) -> bool:
+        """Store a newly received event, returns False if it was already received"""
         try:
-            webhook_secret = os.environ.get('STRIPE_WEBHOOK_SECRET')
-            event = stripe.Webhook.construct_event(
-                payload, sig_header, webhook_secret
-            )
+            db.session.add(StripeEvent(
+                event_id=event['id'],
+                event_type=event['type'],
+                # to_dict() is only recursive from stripe 8 on
+                payload=event.to_dict_recursive() if hasattr(event, 'to_dict_recursive') else event.to_dict()
+            ))
+            db.session.commit()
+            return True
+        except IntegrityError:
+            db.session.rollback()
+            return False
+    
+    def process_event(self, event_id: str) -> bool:
+        """Apply a recorded event in a single transaction, replays are no-ops"""
+        stripe_event = db.session.get(StripeEvent, event_id)
+        if not stripe_event or stripe_event.status == 'processed':
+            return True
+        
+        touched_users = []
+        try:
+            event_object = stripe_event.payload['data']['object']
             
-            if event['type'] == 'checkout.session.completed':
-                self._handle_checkout_completed(event['data']['object'])
-            elif event['type'] == 'customer.subscription.updated':
-                self._handle_subscription_updated(event['data']['object'])
-            elif event['type'] == 'customer.subscription.deleted':
-                self._handle_subscription_cancelled(event['data']['object'])
+            if stripe_event.event_type == 'checkout.session.completed':
+                touched_users.append(self._handle_checkout_completed(event_object))
+            elif stripe_event.event_type == 'customer.subscription.updated':
+                touched_users.append(self._handle_subscription_updated(event_object))
+            elif stripe_event.event_type == 'customer.subscription.deleted':
+                touched_users.append(self._handle_subscription_cancelled(event_object))
             
-            return True
+            stripe_event.status = 'processed'
+            stripe_event.processed_at = datetime.utcnow()
+            db.session.commit()
             
         except Exception as e:
-            print(f"Error handling webhook: {e}")
+            db.session.rollback()
+            print(f"Error processing Stripe event {event_id}: {e}")
+            StripeEvent.query.filter_by(event_id=event_id).update({'status': 'failed'})
+            db.session.commit()
             return False
+        
+        for user in touched_users:
+            if user:
+                invalidate_user(user.id)
+        return True
     
-    def _handle_checkout_completed(self, session):
-        """Handle successful checkout completion"""
+    def is_unprocessed(self, event_id: str) -> bool:
+        """Whether a recorded event still has to be applied, e.g. it failed on a transient error"""
+        status = db.session.query(StripeEvent.status).filter_by(event_id=event_id).scalar()
+        return status in ('pending', 'failed')
+    
+    def pending_event_ids(self) -> List[str]:
+        """IDs of recorded events that were never processed or failed, e.g. after a restart"""
+        return [row.event_id for row in StripeEvent.query.filter(StripeEvent.status.in_(('pending', 'failed')))
+                                                      .order_by(StripeEvent.received_at)
+                                                      .with_entities(StripeEvent.event_id)]
+    
+    def handle_webhook(self, payload: bytes, sig_header: str) -> bool:
+        """Handle Stripe webhook events synchronously"""
         try:
-            user_id = session['metadata']['user_id']
-            plan_type = session['metadata']['plan_type']
+            event = self.construct_event(payload, sig_header)
+            self.record_event(event)
+            return self.process_event(event['id'])
             
-            user = User.query.get(user_id)
-            if user:
-                user.plan_type = plan_type
-                user.plan_start_date = datetime.utcnow()
-                user.plan_end_date = datetime.utcnow() + timedelta(days=30)
-                user.stripe_customer_id = session.get('customer')
-                user.stripe_subscription_id = session.get('subscription')
-                
-                db.session.commit()
-                print(f"User {user.username} upgraded to {plan_type} plan")
-                
         except Exception as e:
-            print(f"Error handling checkout completion: {e}")
+            print(f"Error handling webhook: {e}")
+            return False
+    
+    def _handle_checkout_completed(self, session) -> Optional[User]:
+        """Handle successful checkout completion"""
+        user_id = session['metadata']['user_id']
+        plan_type = session['metadata']['plan_type']
+        
+        user = db.session.get(User, int(user_id))
+        if user:
+            user.plan_type = plan_type
+            user.plan_start_date = datetime.utcnow()
+            user.plan_end_date = datetime.utcnow() + timedelta(days=30)
+            user.stripe_customer_id = session.get('customer')
+            user.stripe_subscription_id = session.get('subscription')
+            print(f"User {user.username} upgraded to {plan_type} plan")
+        return user
     
-    def _handle_subscription_updated(self, subscription):
+    def _handle_subscription_updated(self, subscription) -> Optional[User]:
         """Handle subscription updates"""
-        try:
-            user = User.query.filter_by(stripe_subscription_id=subscription['id']).first()
-            if user:
-                # Update subscription status
-                if subscription['status'] == 'active':
-                    user.plan_end_date = datetime.fromtimestamp(subscription['current_period_end'])
-                db.session.commit()
-                
-        except Exception as e:
-            print(f"Error handling subscription update: {e}")
+        user = User.query.filter_by(stripe_subscription_id=subscription['id']).first()
+        if user:
+            # Update subscription status
+            if subscription['status'] == 'active':
+                user.plan_end_date = datetime.fromtimestamp(subscription['current_period_end'])
+        return user
     
-    def _handle_subscription_cancelled(self, subscription):
+    def _handle_subscription_cancelled(self, subscription) -> Optional[User]:
         """Handle subscription cancellation"""
-        try:
-            user = User.query.filter_by(stripe_subscription_id=subscription['id']).first()
-            if user:
-                user.plan_type = 'free'
-                user.plan_end_date = None
-                db.session.commit()
-                print(f"User {user.username} subscription cancelled")
-                
-        except Exception as e:
-            print(f"Error handling subscription cancellation: {e}")
+        user = User.query.filter_by(stripe_subscription_id=subscription['id']).first()
+        if user:
+            user.plan_type = 'free'
+            user.plan_end_date = None
+            print(f"User {user.username} subscription cancelled")
+        return user
     
-    def get_plans(self) -> Dict:
+    def get_plans(self) -> Mapping[str, Mapping]:
         """Get available subscription plans"""
         return self.plans
     
@@ -144,7 +182,7 @@ class PaymentProcessor:
         """Cancel user's subscription"""
         try:
             if user.stripe_subscription_id:
-                stripe.Subscription.modify(
+                get_stripe().Subscription.modify(
                     user.stripe_subscription_id,
                     cancel_at_period_end=True
                 )
@@ -157,11 +195,14 @@ class PaymentProcessor:
         """Create Stripe customer portal session"""
         try:
             if user.stripe_customer_id:
-                session = stripe.billing_portal.Session.create(
+                session = get_stripe().billing_portal.Session.create(
                     customer=user.stripe_customer_id,
                     return_url=f"{os.environ.get('BASE_URL', 'http://localhost:3000')}/account"
                 )
                 return session.url
         except Exception as e:
             print(f"Error creating portal session: {e}")
-        return None 
\ No newline at end of file
+        return None
+
+# Stateless, so a single processor serves every request
+payment_processor = PaymentProcessor()
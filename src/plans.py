@@ -0,0 +1,121 @@
+"""
+Subscription Plans - Process-wide plan catalog shared by quota enforcement and billing
+"""
+
+import os
+import threading
+from types import MappingProxyType
+from typing import Mapping, Optional
+from src.startup_report import lazy_import
+
+DEFAULT_PLAN = 'free'
+
+# Stories per month for each plan, -1 means unlimited
+PLAN_STORY_LIMITS = MappingProxyType({
+    'free': 1,
+    'basic': 3,
+    'premium': 10,
+    'pro': -1
+})
+
+# Relative share of generation workers each tier gets while its jobs are waiting;
+# anonymous callers of the public forms form their own tier
+PLAN_PRIORITY_WEIGHTS = MappingProxyType({
+    'anonymous': 1,
+    'free': 1,
+    'basic': 2,
+    'premium': 4,
+    'pro': 8
+})
+
+# Plans that include public share links
+SHARING_PLANS = frozenset({'premium', 'pro'})
+
+# Static definition of the paid plans, price IDs come from the environment
+PAID_PLANS = (
+    ('basic', 'Basic Plan', 'STRIPE_BASIC_PRICE_ID', 4.99,
+     ('3 stories per month', 'High-quality PDFs', 'Story history')),
+    ('premium', 'Premium Plan', 'STRIPE_PREMIUM_PRICE_ID', 9.99,
+     ('10 stories per month', 'Premium PDF themes', 'Priority support', 'Story sharing')),
+    ('pro', 'Pro Plan', 'STRIPE_PRO_PRICE_ID', 19.99,
+     ('Unlimited stories', 'All premium themes', 'API access', 'Bulk generation', 'White-label options')),
+)
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+def story_limit(plan_type: str) -> int:
+    """Monthly story limit of a plan, unknown plans get the free limit"""
+    return PLAN_STORY_LIMITS.get(plan_type, PLAN_STORY_LIMITS[DEFAULT_PLAN])
+
+def can_share_stories(plan_type: str) -> bool:
+    """Whether a plan includes public share links"""
+    return plan_type in SHARING_PLANS
+
+def _fetch_price(price_id: str) -> Optional[dict]:
+    """Fetch amount, currency and interval of a Stripe price, None if unavailable"""
+    try:
+        price = lazy_import('stripe').Price.retrieve(price_id, api_key=os.environ.get('STRIPE_SECRET_KEY'))
+        recurring = price.get('recurring') or {}
+        return {
+            'price': price['unit_amount'] / 100 if price.get('unit_amount') is not None else None,
+            'currency': price.get('currency'),
+            'interval': recurring.get('interval')
+        }
+    except Exception as e:
+        print(f"Error fetching Stripe price {price_id}: {e}")
+        return None
+
+def _build_catalog(fetch_prices: bool) -> Mapping[str, Mapping]:
+    """Build the immutable plan catalog from the environment and, optionally, Stripe"""
+    fetch_prices = fetch_prices and bool(os.environ.get('STRIPE_SECRET_KEY'))
+    
+    catalog = {}
+    for plan_type, name, price_env, price, features in PAID_PLANS:
+        plan = {
+            'name': name,
+            'price_id': os.environ.get(price_env),
+            'stories_per_month': PLAN_STORY_LIMITS[plan_type],
+            'price': price,
+            'currency': 'usd',
+            'interval': 'month',
+            'features': features
+        }
+        
+        stripe_price = _fetch_price(plan['price_id']) if fetch_prices and plan['price_id'] else None
+        if stripe_price:
+            plan.update({key: value for key, value in stripe_price.items() if value is not None})
+        
+        catalog[plan_type] = MappingProxyType(plan)
+    
+    return MappingProxyType(catalog)
+
+def get_plan_catalog() -> Mapping[str, Mapping]:
+    """The process-wide plan catalog, built on first use"""
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = _build_catalog(fetch_prices=False)
+    return _catalog
+
+def reload_plan_catalog(fetch_prices: bool = True) -> Mapping[str, Mapping]:
+    """Rebuild the catalog, re-reading price IDs and refreshing prices from Stripe"""
+    global _catalog
+    catalog = _build_catalog(fetch_prices)
+    with _catalog_lock:
+        _catalog = catalog
+    return catalog
+
+def reload_plan_catalog_in_background() -> threading.Thread:
+    """Refresh prices from Stripe without blocking the caller, e.g. server startup"""
+    thread = threading.Thread(target=reload_plan_catalog, name='plan-catalog-reload', daemon=True)
+    thread.start()
+    return thread
+
+def plan_for_price(price_id: str) -> Optional[str]:
+    """Plan type billed with a Stripe price ID"""
+    for plan_type, plan in get_plan_catalog().items():
+        if price_id and plan['price_id'] == price_id:
+            return plan_type
+    return None
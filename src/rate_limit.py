@@ -0,0 +1,239 @@
+"""
+Rate Limiting - Request throttles and admission control, in memory or shared through Redis
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import redis
+except ImportError:
+    # Redis is optional, limits are then kept per process
+    redis = None
+
+class SlidingWindowLimiter:
+    """Allows at most ``limit`` events per key within a sliding window.
+
+    Each key keeps only its last ``limit`` timestamps, and idle keys are
+    swept out periodically, so memory stays proportional to active keys.
+    """
+    
+    def __init__(self, limit: int, window_seconds: float, cleanup_interval: float = 60):
+        """Initialize the limiter"""
+        self.limit = limit
+        self.window = window_seconds
+        self.cleanup_interval = cleanup_interval
+        self._events: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+        self._next_cleanup = time.monotonic() + cleanup_interval
+    
+    def retry_after(self, key: str) -> float:
+        """Seconds until ``key`` may act again, 0 if it is allowed now"""
+        now = time.monotonic()
+        with self._lock:
+            self._cleanup(now)
+            events = self._events.get(key)
+            if not events or len(events) < self.limit:
+                return 0
+            return max(0, events[0] + self.window - now)
+    
+    def hit(self, key: str) -> None:
+        """Record an event for ``key``"""
+        now = time.monotonic()
+        with self._lock:
+            events = self._events.get(key)
+            if events is None:
+                events = self._events[key] = deque(maxlen=self.limit)
+            events.append(now)
+    
+    def reset(self, key: str) -> None:
+        """Forget all events for ``key``"""
+        with self._lock:
+            self._events.pop(key, None)
+    
+    def _cleanup(self, now: float) -> None:
+        """Drop keys whose newest event has left the window"""
+        if now < self._next_cleanup:
+            return
+        self._next_cleanup = now + self.cleanup_interval
+        expired = [key for key, events in self._events.items() if not events or events[-1] + self.window <= now]
+        for key in expired:
+            del self._events[key]
+
+class LoginThrottle:
+    """Throttles failed logins per client IP and per username.
+
+    Only failures count, and a successful login clears the username's
+    history, so legitimate users are unaffected while guessing slows down.
+    """
+    
+    def __init__(self, ip_limit: int = 20, username_limit: int = 5, window_seconds: float = 300):
+        """Initialize the throttle"""
+        self._by_ip = SlidingWindowLimiter(ip_limit, window_seconds)
+        self._by_username = SlidingWindowLimiter(username_limit, window_seconds)
+    
+    def retry_after(self, ip: str, username: str = '') -> int:
+        """Seconds until this IP/username may try again, 0 if allowed now"""
+        wait = self._by_ip.retry_after(ip)
+        if username:
+            wait = max(wait, self._by_username.retry_after(username.lower()))
+        return int(wait + 0.999)
+    
+    def record_failure(self, ip: str, username: str = '') -> None:
+        """Count a failed attempt"""
+        self._by_ip.hit(ip)
+        if username:
+            self._by_username.hit(username.lower())
+    
+    def record_success(self, username: str) -> None:
+        """Clear a username's failures after a successful login"""
+        self._by_username.reset(username.lower())
+
+# A bucket request: (key, capacity, refill rate in tokens per second)
+BucketSpec = Tuple[str, float, float]
+
+class LocalTokenBuckets:
+    """Token buckets kept in process memory.
+
+    Full buckets carry no information, so idle keys are swept out
+    periodically and memory stays proportional to recently active keys.
+    """
+    
+    def __init__(self, cleanup_interval: float = 60):
+        """Initialize the buckets"""
+        self.cleanup_interval = cleanup_interval
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+        self._next_cleanup = time.monotonic() + cleanup_interval
+    
+    def take(self, specs: List[BucketSpec], cost: float = 1) -> float:
+        """Take ``cost`` tokens from every bucket or from none.
+
+        Returns 0 on success, otherwise the seconds until all buckets could
+        pay.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._cleanup(now)
+            levels = []
+            wait = 0.0
+            for key, capacity, rate in specs:
+                tokens, updated = self._buckets.get(key, (capacity, now))
+                tokens = min(capacity, tokens + (now - updated) * rate)
+                levels.append(tokens)
+                if tokens < cost:
+                    wait = max(wait, (cost - tokens) / rate)
+            if wait:
+                return wait
+            for (key, _, _), tokens in zip(specs, levels):
+                self._buckets[key] = (tokens - cost, now)
+            return 0
+    
+    def _cleanup(self, now: float) -> None:
+        """Drop buckets that have been idle long enough to be full again"""
+        if now < self._next_cleanup:
+            return
+        self._next_cleanup = now + self.cleanup_interval
+        idle = [key for key, (_, updated) in self._buckets.items() if now - updated > self.cleanup_interval * 10]
+        for key in idle:
+            del self._buckets[key]
+
+# All-or-none token take over several buckets, timed by the Redis server clock
+REDIS_TAKE_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local cost = tonumber(ARGV[1])
+local levels = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2])
+    local rate = tonumber(ARGV[i * 2 + 1])
+    local state = redis.call('HMGET', key, 'tokens', 'updated')
+    local tokens = tonumber(state[1]) or capacity
+    local updated = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+    levels[i] = tokens
+    if tokens < cost then
+        wait = math.max(wait, (cost - tokens) / rate)
+    end
+end
+if wait > 0 then
+    return tostring(wait)
+end
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2])
+    local rate = tonumber(ARGV[i * 2 + 1])
+    redis.call('HSET', key, 'tokens', levels[i] - cost, 'updated', now)
+    redis.call('EXPIRE', key, math.ceil(capacity / rate) + 60)
+end
+return '0'
+"""
+
+class RedisTokenBuckets:
+    """Token buckets shared by every process through Redis.
+
+    Falls back to process-local buckets while Redis is unreachable, so an
+    outage loosens limits instead of rejecting all traffic.
+    """
+    
+    def __init__(self, url: str, prefix: str = 'ratelimit:'):
+        """Connect lazily to Redis at ``url``"""
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url, socket_timeout=0.5)
+        self._script = self._client.register_script(REDIS_TAKE_SCRIPT)
+        self._fallback = LocalTokenBuckets()
+    
+    def take(self, specs: List[BucketSpec], cost: float = 1) -> float:
+        """Take ``cost`` tokens from every bucket or from none, see LocalTokenBuckets.take"""
+        keys = [self.prefix + key for key, _, _ in specs]
+        args = [cost]
+        for _, capacity, rate in specs:
+            args.extend([capacity, rate])
+        try:
+            return float(self._script(keys=keys, args=args))
+        except redis.RedisError as e:
+            print(f"Rate limit store unavailable, using local limits: {e}")
+            return self._fallback.take(specs, cost)
+
+class AdmissionController:
+    """Admits generation requests through per-IP, per-user and per-plan token buckets.
+
+    Every request pays one token from its client IP bucket and from the
+    shared bucket of its plan tier, so one tier cannot exhaust capacity
+    meant for the others. Signed-in users also pay from a personal bucket
+    sized from their plan's monthly story limit. Verified integrations that
+    relay many end users from one address pass no IP and skip that bucket.
+    """
+    
+    def __init__(self, ip_burst: int = 5, ip_per_hour: float = 20, plan_per_minute: float = 60,
+                 unlimited_burst: int = 20, redis_url: Optional[str] = None):
+        """Initialize the controller, limits are shared through Redis when ``redis_url`` is set"""
+        self.ip_burst = ip_burst
+        self.ip_rate = ip_per_hour / 3600
+        self.plan_per_minute = plan_per_minute
+        self.unlimited_burst = unlimited_burst
+        
+        if redis_url and redis is None:
+            print("RATE_LIMIT_REDIS_URL is set but the redis package is not installed, using local limits")
+        self.buckets = RedisTokenBuckets(redis_url) if redis_url and redis is not None else LocalTokenBuckets()
+    
+    def user_burst(self, user) -> int:
+        """Personal bucket size, the plan's monthly limit or a fixed burst for unlimited plans"""
+        limit = user.get_plan_limits()
+        return limit if limit > 0 else self.unlimited_burst
+    
+    def admit(self, ip: Optional[str], user=None, cost: float = 1) -> int:
+        """Admit one request, returns 0 or the seconds to wait before retrying"""
+        plan_type = user.plan_type if user is not None else 'anonymous'
+        specs = [(f'plan:{plan_type}', self.plan_per_minute, self.plan_per_minute / 60)]
+        if ip is not None:
+            specs.insert(0, (f'ip:{ip}', self.ip_burst, self.ip_rate))
+        if user is not None:
+            # A full personal bucket refills within the hour
+            burst = self.user_burst(user)
+            specs.append((f'user:{user.id}', burst, burst / 3600))
+        
+        wait = self.buckets.take(specs, cost)
+        return int(wait + 0.999) if wait else 0
@@ -0,0 +1,138 @@
+"""
+Subscription Reconciliation - Corrects user plans that drifted from Stripe
+"""
+
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from src.user_models import db
+from src.plans import DEFAULT_PLAN, plan_for_price
+from src.user_cache import invalidate_user
+from src.payments import get_stripe
+
+# Subscriptions in these states keep their paid plan
+ACTIVE_STATUSES = ('active', 'trialing', 'past_due')
+
+def _subscription_state(subscription) -> Dict:
+    """Reduce a Stripe subscription to the fields reconciliation compares"""
+    items = (subscription.get('items') or {}).get('data') or []
+    first_item = items[0] if items else {}
+    price = first_item.get('price') or {}
+    # Newer API versions moved the billing period onto the subscription items
+    period_end = subscription.get('current_period_end') or first_item.get('current_period_end')
+    # The customer is expanded to get its email, older fixtures only carry the ID
+    customer = subscription.get('customer')
+    if isinstance(customer, str) or customer is None:
+        customer = {'id': customer}
+    return {
+        'id': subscription['id'],
+        'status': subscription['status'],
+        'customer': customer.get('id'),
+        'email': (customer.get('email') or '').lower() or None,
+        'price_id': price.get('id'),
+        'period_end': datetime.fromtimestamp(period_end) if period_end else None
+    }
+
+def fetch_subscriptions(page_size: int = 100) -> Dict[str, Dict]:
+    """Page through every Stripe subscription with its customer, keyed by subscription ID"""
+    subscriptions = {}
+    listing = get_stripe().Subscription.list(status='all', limit=page_size, expand=['data.customer'])
+    for subscription in listing.auto_paging_iter():
+        subscriptions[subscription['id']] = _subscription_state(subscription)
+    return subscriptions
+
+def _expected_state(user, subscription: Optional[Dict]) -> Dict:
+    """Plan a user should be on according to their Stripe subscription"""
+    if subscription is None or subscription['status'] not in ACTIVE_STATUSES:
+        return {'plan_type': DEFAULT_PLAN, 'plan_end_date': None}
+
+    # Keep the current paid plan if the price is not one of ours
+    plan_type = plan_for_price(subscription['price_id']) or user.plan_type
+    return {'plan_type': plan_type, 'plan_end_date': subscription['period_end'] or user.plan_end_date}
+
+def _unlinked_matches(user_table, subscriptions: Dict[str, Dict], batch_size: int) -> List[Tuple]:
+    """Users without a subscription ID who have an active subscription, e.g. after a missed checkout event.
+
+    Matched on their Stripe customer ID, or else on their email.
+    """
+    by_customer, by_email = {}, {}
+    # Latest period end last, so it wins when a customer has several active subscriptions
+    active = sorted((sub for sub in subscriptions.values() if sub['status'] in ACTIVE_STATUSES),
+                    key=lambda sub: sub['period_end'] or datetime.min)
+    for sub in active:
+        if sub['customer']:
+            by_customer[sub['customer']] = sub
+        if sub['email']:
+            by_email[sub['email']] = sub
+
+    columns = (user_table.c.id, user_table.c.email, user_table.c.plan_type, user_table.c.plan_end_date,
+               user_table.c.stripe_customer_id)
+    rows = {}
+    for keys, column in ((list(by_customer), user_table.c.stripe_customer_id), (list(by_email), db.func.lower(user_table.c.email))):
+        for start in range(0, len(keys), batch_size):
+            for row in db.session.execute(
+                db.select(*columns).where(user_table.c.stripe_subscription_id.is_(None), column.in_(keys[start:start + batch_size]))
+            ):
+                rows[row.id] = row
+
+    matches = []
+    for row in rows.values():
+        sub = by_customer.get(row.stripe_customer_id) or by_email.get((row.email or '').lower())
+        if sub:
+            matches.append((row, sub))
+    return matches
+
+def reconcile_subscriptions(dry_run: bool = False, batch_size: int = 1000, api_base: Optional[str] = None) -> Dict[str, int]:
+    """Diff user plans against Stripe and apply corrections in bulk.
+
+    Must be called inside an app context. Stripe is read with list calls
+    only, never one request per user. Users not yet linked to a
+    subscription are matched by customer ID or email and linked. Pass
+    ``api_base`` to run against a local Stripe stand-in such as stripe-mock.
+    """
+    if api_base:
+        get_stripe().api_base = api_base
+
+    subscriptions = fetch_subscriptions()
+
+    user = db.metadata.tables['user']
+    users = db.session.execute(
+        db.select(user.c.id, user.c.plan_type, user.c.plan_end_date, user.c.stripe_subscription_id, user.c.stripe_customer_id)
+          .where(user.c.stripe_subscription_id.isnot(None))
+    ).all()
+
+    updates = []
+    for row in users:
+        expected = _expected_state(row, subscriptions.get(row.stripe_subscription_id))
+        if expected['plan_type'] != row.plan_type or expected['plan_end_date'] != row.plan_end_date:
+            updates.append({'row_id': row.id, 'subscription_id': row.stripe_subscription_id,
+                            'customer_id': row.stripe_customer_id, **expected})
+
+    unlinked = _unlinked_matches(user, subscriptions, batch_size)
+    for row, sub in unlinked:
+        updates.append({'row_id': row.id, 'subscription_id': sub['id'],
+                        'customer_id': sub['customer'] or row.stripe_customer_id, **_expected_state(row, sub)})
+
+    stats = {
+        'subscriptions': len(subscriptions),
+        'users_checked': len(users) + len(unlinked),
+        'corrected': len(updates),
+        'linked': len(unlinked),
+        'downgraded': sum(1 for update in updates if update['plan_type'] == DEFAULT_PLAN)
+    }
+    if dry_run or not updates:
+        return stats
+
+    statement = user.update().where(user.c.id == db.bindparam('row_id')).values(
+        plan_type=db.bindparam('plan_type'),
+        plan_end_date=db.bindparam('plan_end_date'),
+        stripe_subscription_id=db.bindparam('subscription_id'),
+        stripe_customer_id=db.bindparam('customer_id')
+    )
+    for start in range(0, len(updates), batch_size):
+        batch = updates[start:start + batch_size]
+        db.session.execute(statement, batch)
+        db.session.commit()
+        for update in batch:
+            invalidate_user(update['row_id'])
+
+    return stats
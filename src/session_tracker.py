@@ -0,0 +1,115 @@
+"""
+Session Tracker - Write-behind buffer for UserSession activity
+"""
+
+import atexit
+import threading
+from datetime import datetime
+from typing import Optional
+from sqlalchemy.dialects import postgresql, sqlite
+from src.user_models import db, UserSession
+
+class SessionActivityBuffer:
+    """Collects session activity in memory and writes it to UserSession in bulk.
+
+    Repeated hits from one session are coalesced, so memory is bounded by
+    the number of distinct active sessions (``max_sessions``). A background
+    thread flushes every ``flush_interval`` seconds, or sooner once
+    ``flush_threshold`` events have been recorded, and the buffer is
+    flushed once more at interpreter shutdown.
+    """
+
+    def __init__(self, flush_interval: float = 30, flush_threshold: int = 500, max_sessions: int = 10000):
+        """Initialize the buffer, call init_app() to start flushing"""
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self.max_sessions = max_sessions
+        self.app = None
+        self.dropped = 0
+        self._pending = {}
+        self._events = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def init_app(self, app) -> None:
+        """Bind the buffer to an app and start the background flusher"""
+        self.app = app
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='session-activity-flusher', daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def record(self, session_id: str, user_id: Optional[int], ip_address: str, user_agent: str) -> None:
+        """Record one request for a session, O(1) and without touching the database"""
+        now = datetime.utcnow()
+        with self._lock:
+            entry = self._pending.get(session_id)
+            if entry is None:
+                if len(self._pending) >= self.max_sessions:
+                    self.dropped += 1
+                    self._wakeup.set()
+                    return
+                entry = self._pending[session_id] = {'session_id': session_id, 'created_at': now}
+            entry.update({
+                'user_id': user_id,
+                'ip_address': (ip_address or '')[:45],
+                'user_agent': (user_agent or '')[:500],
+                'last_activity': now
+            })
+            self._events += 1
+            if self._events >= self.flush_threshold:
+                self._wakeup.set()
+
+    def flush(self) -> int:
+        """Write all buffered activity in one bulk upsert, returns the number of sessions written"""
+        with self._flush_lock:
+            with self._lock:
+                rows = list(self._pending.values())
+                self._pending = {}
+                self._events = 0
+            if not rows or self.app is None:
+                return 0
+
+            try:
+                with self.app.app_context():
+                    self._upsert(rows)
+            except Exception as e:
+                print(f"Error flushing session activity: {e}")
+                return 0
+            return len(rows)
+
+    def _upsert(self, rows) -> None:
+        """Insert new sessions and refresh existing ones"""
+        dialect = db.engine.dialect.name
+        if dialect in ('sqlite', 'postgresql'):
+            insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+            statement = insert(UserSession.__table__)
+            statement = statement.on_conflict_do_update(
+                index_elements=['session_id'],
+                set_={
+                    'user_id': statement.excluded.user_id,
+                    'ip_address': statement.excluded.ip_address,
+                    'user_agent': statement.excluded.user_agent,
+                    'last_activity': statement.excluded.last_activity,
+                    'is_active': True
+                }
+            )
+            db.session.execute(statement, [{**row, 'is_active': True} for row in rows])
+        else:
+            for row in rows:
+                session = UserSession.query.filter_by(session_id=row['session_id']).first()
+                if session is None:
+                    db.session.add(UserSession(is_active=True, **row))
+                else:
+                    for key in ('user_id', 'ip_address', 'user_agent', 'last_activity'):
+                        setattr(session, key, row[key])
+        db.session.commit()
+
+    def _run(self) -> None:
+        """Background loop flushing on the interval or when woken up early"""
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
@@ -0,0 +1,123 @@
+"""
+Story Sharing - Immutable snapshots behind public share links
+"""
+
+import gzip
+import hashlib
+import os
+import re
+import secrets
+import shutil
+import uuid
+from typing import Dict, Optional
+from flask import render_template
+from src.user_models import Story
+from src.exporters import DEFAULT_FORMAT, document_cache, get_exporter
+from src.exporters.document import content_key
+
+# Published snapshots, one directory per share key
+SHARED_DIR = os.path.join('data', 'shared')
+
+SHARE_KEY_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+# Files a snapshot may contain; index.html.gz is only served in place of index.html
+SNAPSHOT_FILES = ('index.html', 'story.pdf', 'story.txt')
+
+def render_story_html(story_id: str, story_text: str, story_data: Dict, download_url: str) -> str:
+    """Render the story page"""
+    return render_template('story.html',
+        story_content=story_text,
+        name1=story_data.get('name1', 'Unknown'),
+        name2=story_data.get('name2', 'Unknown'),
+        setting=story_data.get('setting', 'Unknown'),
+        how_met=story_data.get('how_met', 'Unknown'),
+        generated_at=story_data.get('submitted_at', 'Unknown'),
+        story_id=story_id,
+        download_url=download_url
+    )
+
+class SnapshotStore:
+    """Write-once snapshot directories, served straight from disk.
+
+    A snapshot is written to a temporary directory and renamed into place,
+    so readers never see a partial one and an existing snapshot is never
+    modified.
+    """
+
+    def __init__(self, root: str = SHARED_DIR):
+        """Initialize the store"""
+        self.root = os.path.abspath(root)
+
+    def path(self, share_key: str, filename: str = 'index.html') -> Optional[str]:
+        """Absolute path of a snapshot file, None if the key or file is invalid"""
+        if not SHARE_KEY_PATTERN.match(share_key) or filename not in SNAPSHOT_FILES + ('index.html.gz',):
+            return None
+        path = os.path.join(self.root, share_key, filename)
+        return path if os.path.isfile(path) else None
+
+    def exists(self, share_key: str) -> bool:
+        """Check whether a snapshot has been written"""
+        return os.path.isdir(os.path.join(self.root, share_key))
+
+    def write(self, share_key: str, files: Dict[str, bytes]) -> None:
+        """Atomically create a snapshot, a no-op if it already exists"""
+        if self.exists(share_key):
+            return
+        os.makedirs(self.root, exist_ok=True)
+        staging = os.path.join(self.root, f'.tmp-{uuid.uuid4().hex}')
+        os.makedirs(staging)
+        try:
+            for filename, data in files.items():
+                with open(os.path.join(staging, filename), 'wb') as f:
+                    f.write(data)
+            os.rename(staging, os.path.join(self.root, share_key))
+        except OSError:
+            # Lost a race with another publisher of the same content
+            shutil.rmtree(staging, ignore_errors=True)
+            if not self.exists(share_key):
+                raise
+
+    def remove(self, share_key: str) -> None:
+        """Delete a snapshot"""
+        if SHARE_KEY_PATTERN.match(share_key):
+            shutil.rmtree(os.path.join(self.root, share_key), ignore_errors=True)
+
+snapshot_store = SnapshotStore()
+
+def publish_story(story: Story) -> str:
+    """Write the snapshot of a story and mark it public, returns the share key.
+
+    Every publish gets a new key, so a link served as immutable is never
+    reused for other content, nor revived after the story was unshared.
+    Must be called in a request context; the caller commits and then
+    releases the story's previous share key.
+    """
+    story_data = story.story_data or {}
+    nonce = secrets.token_hex(16)
+    share_key = hashlib.sha256(f'{content_key(story.story_text, story_data)}:{nonce}'.encode('utf-8')).hexdigest()[:32]
+
+    exporter = get_exporter(DEFAULT_FORMAT)
+    download_name = f'story.{exporter.extension}'
+    html = render_story_html(story.story_id, story.story_text, story_data, f'/s/{share_key}/{download_name}').encode('utf-8')
+    document = document_cache.load(story.story_id, story.story_text, story_data)
+    snapshot_store.write(share_key, {
+        'index.html': html,
+        'index.html.gz': gzip.compress(html, compresslevel=9, mtime=0),
+        download_name: exporter.to_bytes(document)
+    })
+    
+    story.is_public = True
+    story.share_key = share_key
+    return share_key
+
+def unpublish_story(story: Story) -> Optional[str]:
+    """Mark a story private, returns the share key to release after committing"""
+    share_key = story.share_key
+    story.is_public = False
+    story.share_key = None
+    return share_key
+
+def release_snapshot(share_key: Optional[str]) -> None:
+    """Delete a snapshot once no public story uses it any more"""
+    if share_key and not Story.query.filter_by(share_key=share_key).count():
+        snapshot_store.remove(share_key)
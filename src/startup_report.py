@@ -0,0 +1,85 @@
+"""
+Startup Report - Timings of process startup and of dependencies loaded on first use
+"""
+
+import importlib
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable
+
+class StartupReport:
+    """Records how long each startup phase and each lazily loaded module took.
+
+    Phases are marked in order by the process that imports the app. Heavy
+    dependencies (OpenAI, Stripe, ReportLab) are imported with
+    lazy_import() on first use, so their cost shows up as a one-off under
+    ``lazy_imports`` instead of on every cold start.
+    """
+
+    def __init__(self):
+        """Start the clock"""
+        self.started = time.perf_counter()
+        self._last_mark = self.started
+        self.ready_at = None
+        self._phases = OrderedDict()
+        self._lazy_imports = OrderedDict()
+        self._lock = threading.Lock()
+
+    def mark(self, phase: str) -> None:
+        """Record the time since the previous mark as one startup phase"""
+        now = time.perf_counter()
+        self._phases[phase] = now - self._last_mark
+        self._last_mark = now
+
+    def mark_ready(self) -> None:
+        """Record that the app finished importing and can serve requests"""
+        self.ready_at = time.perf_counter()
+
+    def lazy_import(self, name: str):
+        """Import a module on first use, recording how long the first import took"""
+        module = sys.modules.get(name)
+        if module is not None:
+            return module
+
+        with self._lock:
+            module = sys.modules.get(name)
+            if module is not None:
+                return module
+            start = time.perf_counter()
+            module = importlib.import_module(name)
+            self._lazy_imports[name] = {
+                'seconds': time.perf_counter() - start,
+                'after_startup': self.ready_at is not None
+            }
+        return module
+
+    def preload(self, names: Iterable[str]) -> None:
+        """Import lazily loaded modules now, e.g. in a master process before it forks workers"""
+        for name in names:
+            try:
+                self.lazy_import(name)
+            except ImportError as e:
+                print(f"Error preloading {name}: {e}")
+
+    def report(self) -> Dict:
+        """Startup timings in milliseconds"""
+        def ms(seconds):
+            return round(seconds * 1000, 1)
+
+        return {
+            'ready_ms': ms(self.ready_at - self.started) if self.ready_at else None,
+            'phases': {name: ms(seconds) for name, seconds in self._phases.items()},
+            'lazy_imports': {
+                name: {'ms': ms(entry['seconds']), 'after_startup': entry['after_startup']}
+                for name, entry in self._lazy_imports.items()
+            },
+            'modules_loaded': len(sys.modules)
+        }
+
+startup_report = StartupReport()
+
+def lazy_import(name: str):
+    """Import a heavy dependency on first use through the process-wide report"""
+    return startup_report.lazy_import(name)
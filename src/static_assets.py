@@ -0,0 +1,176 @@
+"""
+Static Assets - Precompressed, ETag-validated responses for static and cached pages
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+from flask import Response, request
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    # Brotli is in requirements.txt; without it only gzip variants are served
+    BROTLI_AVAILABLE = False
+
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = 256
+
+class StaticAsset:
+    """One asset with its identity body and precomputed compressed variants"""
+
+    def __init__(self, body: bytes, content_type: str, gzip_level: int = 9, brotli_quality: int = 11):
+        """Compress the body and derive a content-hash ETag for every variant"""
+        self.content_type = content_type
+        self.variants = {'identity': body}
+        if len(body) >= MIN_COMPRESS_SIZE:
+            compressed = {'gzip': gzip.compress(body, compresslevel=gzip_level, mtime=0)}
+            if BROTLI_AVAILABLE:
+                compressed['br'] = brotli.compress(body, quality=brotli_quality)
+            for encoding, data in compressed.items():
+                if len(data) < len(body):
+                    self.variants[encoding] = data
+
+        digest = hashlib.sha256(body).hexdigest()[:20]
+        # Each encoding is a different representation, so each gets its own strong ETag
+        self.etags = {
+            encoding: f'"{digest}"' if encoding == 'identity' else f'"{digest}-{encoding}"'
+            for encoding in self.variants
+        }
+
+    def choose_encoding(self, accept_encoding: str) -> str:
+        """Pick the smallest variant the client accepts"""
+        accepted = {}
+        for part in accept_encoding.split(','):
+            coding, _, params = part.strip().partition(';')
+            quality = 1.0
+            if params.strip().startswith('q='):
+                try:
+                    quality = float(params.strip()[2:])
+                except ValueError:
+                    quality = 0.0
+            accepted[coding.strip().lower()] = quality
+
+        candidates = [
+            encoding for encoding in self.variants
+            if encoding != 'identity' and accepted.get(encoding, accepted.get('*', 0)) > 0
+        ]
+        if not candidates:
+            return 'identity'
+        return min(candidates, key=lambda encoding: len(self.variants[encoding]))
+
+class StaticAssets:
+    """Registry of static pages served from memory with conditional request support.
+
+    Assets are registered once at startup, so serving one is a dict lookup
+    and, for revalidations, a 304 without a body.
+    """
+
+    gzip_level = 9
+    brotli_quality = 11
+
+    def __init__(self, max_age: int = 3600, cache_control: Optional[str] = None):
+        """Initialize the registry, ``max_age`` is the Cache-Control lifetime in seconds"""
+        self.cache_control = cache_control or f'public, max-age={max_age}'
+        self._assets: Dict[str, StaticAsset] = {}
+
+    def add(self, name: str, body, content_type: Optional[str] = None) -> StaticAsset:
+        """Register an asset from a string or bytes body"""
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        if content_type is None:
+            content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        if content_type.startswith('text/') and 'charset' not in content_type:
+            content_type += '; charset=utf-8'
+        asset = StaticAsset(body, content_type, self.gzip_level, self.brotli_quality)
+        self._store(name, asset)
+        return asset
+
+    def add_file(self, name: str, path: str, content_type: Optional[str] = None) -> StaticAsset:
+        """Register an asset from a file on disk"""
+        with open(path, 'rb') as f:
+            return self.add(name, f.read(), content_type)
+
+    def get(self, name: str) -> Optional[StaticAsset]:
+        """Look up a registered asset"""
+        return self._assets.get(name)
+
+    def response(self, name: str) -> Response:
+        """Build the response for a registered asset, 404 if there is none"""
+        asset = self.get(name)
+        if asset is None:
+            return Response('Not found', status=404)
+        return self.serve(asset)
+
+    def serve(self, asset: StaticAsset) -> Response:
+        """Build the response for the current request, 304 if the client copy is current"""
+        encoding = asset.choose_encoding(request.headers.get('Accept-Encoding', ''))
+        etag = asset.etags[encoding]
+        headers = {
+            'ETag': etag,
+            'Cache-Control': self.cache_control,
+            'Vary': 'Accept-Encoding'
+        }
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+
+        if_none_match = request.headers.get('If-None-Match', '')
+        if if_none_match.strip() == '*' or etag in [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]:
+            return Response(status=304, headers=headers)
+
+        return Response(asset.variants[encoding], content_type=asset.content_type, headers=headers)
+
+    def _store(self, name: str, asset: StaticAsset) -> None:
+        self._assets[name] = asset
+
+class RenderedPageCache(StaticAssets):
+    """Bounded LRU cache of pages rendered on demand, e.g. one entry per story.
+
+    Pages are compressed with cheaper settings than startup assets since
+    they are built on the request path, and must be invalidated when the
+    data they were rendered from changes. Pages also expire after ``ttl``
+    seconds, for changes made by other processes.
+    """
+
+    gzip_level = 6
+    brotli_quality = 5
+
+    def __init__(self, max_entries: int = 1024, cache_control: str = 'no-cache', ttl: float = 60):
+        """Initialize the cache, pages are revalidated on every view by default"""
+        super().__init__(cache_control=cache_control)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._assets = OrderedDict()
+        self._stored_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> Optional[StaticAsset]:
+        """Look up a cached page and mark it recently used"""
+        with self._lock:
+            asset = self._assets.get(name)
+            if asset is not None and time.monotonic() - self._stored_at[name] > self.ttl:
+                del self._assets[name], self._stored_at[name]
+                asset = None
+            if asset is not None:
+                self._assets.move_to_end(name)
+            return asset
+
+    def invalidate(self, name: str) -> None:
+        """Drop a page so the next view renders it again"""
+        with self._lock:
+            self._assets.pop(name, None)
+            self._stored_at.pop(name, None)
+
+    def _store(self, name: str, asset: StaticAsset) -> None:
+        with self._lock:
+            self._assets[name] = asset
+            self._stored_at[name] = time.monotonic()
+            self._assets.move_to_end(name)
+            while len(self._assets) > self.max_entries:
+                evicted, _ = self._assets.popitem(last=False)
+                self._stored_at.pop(evicted, None)
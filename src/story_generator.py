@@ -2,34 +2,17 @@
 Story Generator Module - Handles ChatGPT API integration
 """
 
-import openai
+import threading
 from typing import Dict, Optional
+from src.startup_report import lazy_import
 
-class StoryGenerator:
-    """Handles love story generation using OpenAI's ChatGPT API"""
-    
-    def __init__(self, api_key: str, model_name: str = "gpt-4-turbo-preview", max_tokens: int = 2000, temperature: float = 0.7):
-        """Initialize the story generator with API key and model settings"""
-        if not api_key:
-            raise ValueError("OpenAI API key is required")
-        self.client = openai.OpenAI(api_key=api_key)
-        self.model = model_name
-        self.max_tokens = max_tokens
-        self.temperature = temperature
-        
-    def create_prompt(self, form_data: Dict) -> str:
-        """Create a detailed prompt based on form responses"""
-        
-        prompt = f"""You are a creative romance writer. Create a beautiful, heartwarming love story based on the following personal details:
+SYSTEM_PROMPT = "You are a talented romance novelist who writes beautiful, emotional love stories with vivid descriptions and authentic dialogue."
 
-Character Details:
-- {form_data.get('name1', 'Alex')} and {form_data.get('name2', 'Jordan')} are the main characters
-
-Their Love Story:
-- How they met: {form_data.get('how_met', 'by chance')}
-- Favorite memory together: {form_data.get('favorite_memory', 'a special moment')}
-- What they love most about each other: {form_data.get('special_thing', 'their deep connection')}
-- Special song/phrase/joke: {form_data.get('special_song', 'their unique bond')}
+# Constant instruction block - must not contain any per-request data so the prompt
+# prefix stays byte-identical. OpenAI only caches prefixes of 1024+ tokens on models
+# with prompt caching (not gpt-4-turbo-preview); this block is about 250 tokens, so
+# it only becomes cacheable if it grows past that threshold
+PROMPT_INSTRUCTIONS = """You are a creative romance writer. Create a beautiful, heartwarming love story based on the personal details given at the end of this message.
 
 Story Requirements:
 - Start with a creative, romantic title for the story (e.g., "A Symphony of Love", "When Stars Align", "The Language of Hearts")
@@ -46,9 +29,51 @@ Story Requirements:
 
 Format the response with the title on the first line, followed by the story content.
 
-Create a story that captures the essence of their real love story and celebrates their unique connection."""
+Create a story that captures the essence of their real love story and celebrates their unique connection.
+
+"""
+
+PROMPT_DETAILS = """Character Details:
+- {name1} and {name2} are the main characters
+
+Their Love Story:
+- How they met: {how_met}
+- Favorite memory together: {favorite_memory}
+- What they love most about each other: {special_thing}
+- Special song/phrase/joke: {special_song}"""
+
+class StoryGenerator:
+    """Handles love story generation using OpenAI's ChatGPT API"""
+    
+    def __init__(self, api_key: str, model_name: str = "gpt-4-turbo-preview", max_tokens: int = 2000, temperature: float = 0.7, track_prompt_cache: bool = False):
+        """Initialize the story generator with API key and model settings"""
+        if not api_key:
+            raise ValueError("OpenAI API key is required")
+        # The OpenAI SDK is slow to import, so it is loaded with the first generator
+        self.client = lazy_import('openai').OpenAI(api_key=api_key)
+        self.model = model_name
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        
+        # Optional instrumentation of OpenAI prompt caching
+        self.track_prompt_cache = track_prompt_cache
+        self.prompt_cache_stats = {'requests': 0, 'prompt_tokens': 0, 'cached_tokens': 0}
+        self._stats_lock = threading.Lock()
+        
+    def create_prompt(self, form_data: Dict) -> str:
+        """Create a detailed prompt based on form responses.
 
-        return prompt
+        The invariant instructions come first and the personal details last,
+        so every request shares the same prompt prefix.
+        """
+        return PROMPT_INSTRUCTIONS + PROMPT_DETAILS.format(
+            name1=form_data.get('name1', 'Alex'),
+            name2=form_data.get('name2', 'Jordan'),
+            how_met=form_data.get('how_met', 'by chance'),
+            favorite_memory=form_data.get('favorite_memory', 'a special moment'),
+            special_thing=form_data.get('special_thing', 'their deep connection'),
+            special_song=form_data.get('special_song', 'their unique bond')
+        )
         
     def generate_story(self, form_data: Dict) -> Optional[str]:
         """Generate a love story using ChatGPT"""
@@ -66,7 +91,7 @@ Create a story that captures the essence of their real love story and celebrates
             response = self.client.chat.completions.create(
                 model=self.model,
                 messages=[
-                    {"role": "system", "content": "You are a talented romance novelist who writes beautiful, emotional love stories with vivid descriptions and authentic dialogue."},
+                    {"role": "system", "content": SYSTEM_PROMPT},
                     {"role": "user", "content": prompt}
                 ],
                 max_tokens=self.max_tokens,
@@ -76,6 +101,8 @@ Create a story that captures the essence of their real love story and celebrates
             )
             
             logger.info("API call successful, processing response...")
+            if self.track_prompt_cache:
+                self._record_prompt_cache_usage(response, logger)
             story = response.choices[0].message.content
             logger.info(f"Story received, length: {len(story) if story else 0} characters")
             
@@ -88,6 +115,27 @@ Create a story that captures the essence of their real love story and celebrates
             print(f"Error generating story: {e}")
             return None
             
+    def _record_prompt_cache_usage(self, response, logger) -> None:
+        """Record the cached prompt token counts reported in ``response.usage``"""
+        usage = getattr(response, 'usage', None)
+        if usage is None:
+            return
+        
+        details = getattr(usage, 'prompt_tokens_details', None)
+        prompt_tokens = getattr(usage, 'prompt_tokens', 0) or 0
+        cached_tokens = (getattr(details, 'cached_tokens', 0) or 0) if details else 0
+        
+        with self._stats_lock:
+            self.prompt_cache_stats['requests'] += 1
+            self.prompt_cache_stats['prompt_tokens'] += prompt_tokens
+            self.prompt_cache_stats['cached_tokens'] += cached_tokens
+            totals = dict(self.prompt_cache_stats)
+        
+        logger.info(
+            f"Prompt cache: {cached_tokens}/{prompt_tokens} prompt tokens cached "
+            f"(cumulative {totals['cached_tokens']}/{totals['prompt_tokens']} over {totals['requests']} requests)"
+        )
+            
     def save_story(self, story: Optional[str], filename: Optional[str] = None) -> bool:
         """Save the generated story to a file"""
         
@@ -0,0 +1,157 @@
+"""
+Story Store - Persistent story lookup shared by display, download and export
+"""
+
+import glob
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+from src.user_models import db, Story
+
+# Generated stories, one ``<story_id>.json`` file each
+STORIES_DIR = os.path.join('data', 'stories')
+
+# Submissions saved by TallyHandler.save_submission before stories had their own files
+LEGACY_SUBMISSIONS = os.path.join('data', 'submission_*.json')
+
+STORY_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,100}$')
+
+class StoryStore:
+    """Resolves story IDs to ``{'story_text', 'story_data'}`` from durable storage.
+
+    Lookups go through a bounded LRU of hot stories, then the ``story``
+    table (unique index on story_id), then the story's own file. Nothing
+    depends on the process that generated the story, so lookups work after
+    a restart and across workers. Legacy submission files are indexed once
+    per process instead of being scanned on every miss.
+
+    Anonymous stories are readable by anyone with the link; account stories
+    only by their owner, or by anyone once they are public. Edits made by
+    other workers do not evict this worker's hot entries, so the owner and
+    is_public of account stories are re-read on every lookup and hot
+    entries expire after ``ttl`` seconds.
+    """
+
+    def __init__(self, root: str = STORIES_DIR, hot_size: int = 256, ttl: float = 60):
+        """Initialize the store"""
+        self.root = root
+        self.hot_size = hot_size
+        self.ttl = ttl
+        self._hot = OrderedDict()
+        self._lock = threading.Lock()
+        self._legacy_index = None
+        self._legacy_lock = threading.Lock()
+
+    def save(self, story_id: str, story_text: str, story_data: Dict) -> None:
+        """Persist an anonymous story and make it hot"""
+        story = {'story_text': story_text, 'story_data': story_data}
+        os.makedirs(self.root, exist_ok=True)
+        fd, staging = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(story, f, ensure_ascii=False)
+            os.replace(staging, self._path(story_id))
+        except Exception:
+            os.unlink(staging)
+            raise
+        self._remember(story_id, story)
+
+    def get(self, story_id: str, viewer_id: Optional[int] = None) -> Optional[Dict]:
+        """Look up a story, None if it does not exist or ``viewer_id`` may not read it"""
+        if not STORY_ID_PATTERN.match(story_id):
+            return None
+
+        now = time.monotonic()
+        with self._lock:
+            story, loaded_at = self._hot.get(story_id, (None, 0))
+            if story is not None and now - loaded_at > self.ttl:
+                del self._hot[story_id]
+                story = None
+            if story is not None:
+                self._hot.move_to_end(story_id)
+
+        if story is None:
+            story = self._load(story_id)
+            if story is None:
+                return None
+            self._remember(story_id, story)
+        elif 'user_id' in story:
+            # Sharing may have changed in another worker, one indexed lookup per view
+            access = db.session.query(Story.user_id, Story.is_public).filter_by(story_id=story_id).first()
+            if access is None:
+                self.invalidate(story_id)
+                return None
+            story = {**story, 'user_id': access.user_id, 'is_public': bool(access.is_public)}
+        return story if self._can_read(story, viewer_id) else None
+
+    @staticmethod
+    def _can_read(story: Dict, viewer_id: Optional[int]) -> bool:
+        owner_id = story.get('user_id')
+        return owner_id is None or story.get('is_public') or owner_id == viewer_id
+
+    def invalidate(self, story_id: str) -> None:
+        """Drop a story from the hot cache after it changed"""
+        with self._lock:
+            self._hot.pop(story_id, None)
+
+    def _load(self, story_id: str) -> Optional[Dict]:
+        """Read a story from the database or its file"""
+        saved_story = Story.get_with_content(story_id)
+        if saved_story:
+            return {
+                'story_text': saved_story.story_text,
+                'story_data': saved_story.story_data or {},
+                'user_id': saved_story.user_id,
+                'is_public': bool(saved_story.is_public)
+            }
+
+        for path in (self._path(story_id), self._legacy_path(story_id)):
+            if not path:
+                continue
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    saved_data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if 'submission_data' in saved_data:
+                # Legacy submission file layout
+                return {'story_text': saved_data.get('story_text') or '', 'story_data': saved_data['submission_data']}
+            return saved_data
+        return None
+
+    def _path(self, story_id: str) -> str:
+        return os.path.join(self.root, f'{story_id}.json')
+
+    def _legacy_path(self, story_id: str) -> Optional[str]:
+        """Legacy submission file of a story, indexed on first use"""
+        if self._legacy_index is None:
+            with self._legacy_lock:
+                if self._legacy_index is None:
+                    self._legacy_index = self._build_legacy_index()
+        return self._legacy_index.get(story_id)
+
+    def _build_legacy_index(self) -> Dict[str, str]:
+        """Map story IDs to legacy submission files, using the same ID rule as story generation"""
+        index = {}
+        for path in sorted(glob.glob(LEGACY_SUBMISSIONS)):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    submission_id = json.load(f).get('submission_data', {}).get('submission_id', '')
+            except (OSError, ValueError):
+                continue
+            story_id = re.sub(r'[^a-zA-Z0-9]', '', submission_id[:8])
+            if story_id:
+                index[story_id] = path
+        return index
+
+    def _remember(self, story_id: str, story: Dict) -> None:
+        with self._lock:
+            self._hot[story_id] = (story, time.monotonic())
+            self._hot.move_to_end(story_id)
+            while len(self._hot) > self.hot_size:
+                self._hot.popitem(last=False)
@@ -2,12 +2,41 @@
 Tally Form Handler - Processes Tally form submissions for love story generation
 """
 
+import base64
+import hmac
 import json
 import os
-from typing import Dict, Optional
+import re
+from typing import Dict, Iterator, Optional
 from datetime import datetime
 import hashlib
 
+# Keyword fallbacks for field IDs that match none of the known aliases
+FALLBACK_KEYWORDS = [
+    ('name', ['name']),
+    ('setting', ['place', 'where']),
+    ('how_met', ['meet', 'encounter']),
+    ('shared_interest', ['interest', 'hobby']),
+    ('challenge', ['challenge', 'obstacle']),
+    ('special_thing', ['special', 'unique']),
+    ('story_length', ['length', 'duration'])
+]
+
+def _compile_keyword_index(groups):
+    """Compile ``(key, [keywords])`` pairs into one regex plus a keyword -> key dict"""
+    index = {}
+    for key, keywords in groups:
+        for keyword in keywords:
+            index.setdefault(keyword, key)
+    
+    # Longest keywords first so the most specific one wins at a position
+    words = sorted(index, key=len, reverse=True)
+    pattern = re.compile('|'.join(re.escape(word) for word in words))
+    return pattern, index
+
+# Upper bound on the number of forms whose field mappings are cached
+MAX_CACHED_FORMS = 256
+
 class TallyHandler:
     """Handles Tally form submissions and converts them to story generation format"""
     
@@ -22,6 +51,8 @@ class TallyHandler:
             'shared_interest': ['shared_interest', 'common_interest', 'hobby', 'passion'],
             'challenge': ['challenge', 'obstacle', 'conflict', 'difficulty'],
             'special_thing': ['love_most', 'special_thing', 'unique', 'special', 'what_makes_special'],
+            'favorite_memory': ['favorite_memory', 'favourite_memory', 'memory'],
+            'special_song': ['special_song', 'song', 'phrase', 'inside_joke'],
             'story_length': ['story_length', 'length', 'duration']
         }
         
@@ -34,51 +65,81 @@ class TallyHandler:
             'shared_interest': 'reading and writing',
             'challenge': 'long distance relationship',
             'special_thing': 'their ability to understand each other without words',
+            'favorite_memory': 'a special moment',
+            'special_song': 'their unique bond',
             'story_length': 'medium'
         }
+        
+        # Compiled lookups: exact alias matches, then alias and keyword substrings
+        self._alias_pattern, self._exact_fields = _compile_keyword_index(self.form_fields_mapping.items())
+        self._fallback_pattern, self._fallback_keywords = _compile_keyword_index(FALLBACK_KEYWORDS)
+        
+        # Resolved fieldId -> internal key mappings, per Tally formId
+        self._form_field_cache: Dict[str, Dict[str, Optional[str]]] = {}
+    
+    def verify_signature(self, payload: bytes, signature: str, secret: str) -> bool:
+        """Check the Tally-Signature header, a base64 HMAC-SHA256 of the raw body"""
+        expected = base64.b64encode(hmac.new(secret.encode('utf-8'), payload, hashlib.sha256).digest()).decode('ascii')
+        return hmac.compare_digest(expected, signature or '')
     
-    def process_tally_webhook(self, webhook_data: Dict) -> Dict:
-        """Process incoming Tally webhook data and convert to story format"""
+    def process_tally_webhook(self, webhook_data: Dict) -> Iterator[Dict]:
+        """Process incoming Tally webhook data, yielding one story record per form response"""
         
-        try:
-            # Extract form responses from Tally webhook
-            form_responses = webhook_data.get('eventBody', {}).get('event', {}).get('formResponses', [])
-            
-            if not form_responses:
-                raise ValueError("No form responses found in webhook data")
-            
-            # Get the latest response
-            latest_response = form_responses[0]
-            answers = latest_response.get('answers', [])
-            
-            # Convert Tally answers to our format
-            story_data = self._convert_tally_answers(answers)
-            
-            # Add metadata
-            story_data['submission_id'] = latest_response.get('responseId', '')
-            story_data['submitted_at'] = latest_response.get('submittedAt', '')
-            story_data['form_id'] = webhook_data.get('eventBody', {}).get('event', {}).get('formId', '')
-            
-            return story_data
-            
-        except Exception as e:
-            print(f"Error processing Tally webhook: {e}")
-            return {}
+        event = webhook_data.get('eventBody', {}).get('event', {})
+        form_id = event.get('formId', '')
+        
+        for response in self._iter_form_responses(webhook_data):
+            try:
+                # Convert Tally answers to our format
+                story_data = self._convert_tally_answers(response.get('answers', []), form_id)
+                
+                # Add metadata
+                story_data['submission_id'] = response.get('responseId', '')
+                story_data['submitted_at'] = response.get('submittedAt', '')
+                story_data['form_id'] = form_id
+                
+                yield story_data
+                
+            except Exception as e:
+                print(f"Error processing Tally response {response.get('responseId', '')}: {e}")
     
-    def _convert_tally_answers(self, answers: list) -> Dict:
+    def process_universal_webhook(self, webhook_data: Dict) -> Iterator[Dict]:
+        """Process universal form webhook data, yielding the raw answers of each form response"""
+        
+        for response in self._iter_form_responses(webhook_data):
+            try:
+                form_data = {answer['fieldId']: answer['value'] for answer in response['answers']}
+                form_data['submission_id'] = response.get('responseId', '')
+                form_data['submitted_at'] = response.get('submittedAt', '')
+                
+                yield form_data
+                
+            except (KeyError, TypeError) as e:
+                print(f"Error processing universal response {response.get('responseId', '')}: {e}")
+    
+    def _iter_form_responses(self, webhook_data: Dict) -> Iterator[Dict]:
+        """Iterate over every form response in a Tally webhook payload"""
+        
+        form_responses = webhook_data.get('eventBody', {}).get('event', {}).get('formResponses', [])
+        
+        if not form_responses:
+            print("Error processing Tally webhook: No form responses found in webhook data")
+        
+        for response in form_responses:
+            if isinstance(response, dict):
+                yield response
+    
+    def _convert_tally_answers(self, answers: list, form_id: str = '') -> Dict:
         """Convert Tally answer format to our story data format"""
         
         story_data = {}
+        field_keys = self._resolve_form_fields(form_id, [answer.get('fieldId', '') for answer in answers])
         
         for answer in answers:
-            field_id = answer.get('fieldId', '')
-            field_value = answer.get('value', '')
-            
-            # Map Tally field to our internal key
-            internal_key = self._map_tally_field(field_id, field_value)
+            internal_key = field_keys.get(answer.get('fieldId', ''))
             
             if internal_key:
-                story_data[internal_key] = field_value
+                story_data[internal_key] = answer.get('value', '')
         
         # Fill in missing fields with defaults
         for key, default_value in self.defaults.items():
@@ -87,35 +148,57 @@ class TallyHandler:
         
         return story_data
     
-    def _map_tally_field(self, field_id: str, field_value: str) -> Optional[str]:
-        """Map Tally field ID to our internal field key"""
+    def _resolve_form_fields(self, form_id: str, field_ids: list) -> Dict[str, Optional[str]]:
+        """Map every field ID of a submission, reusing the cached mapping for known forms"""
         
-        # This is a simplified mapping - you'll need to update this based on your actual Tally form
-        # You can get the field IDs from your Tally form webhook test
+        cached = self._form_field_cache.get(form_id) if form_id else None
+        if cached is not None and all(field_id in cached for field_id in field_ids):
+            return cached
+        
+        # Remap every field the form is known to have, a new exact match may
+        # take a name slot an earlier generic "name" field was given
+        mapped = {field_id: self._map_tally_field(field_id) for field_id in [*(cached or {}), *field_ids]}
         
-        # Common field name patterns
+        # Exact matches first, so generic "name" fields only get the name slots left over
+        field_keys = {field_id: key for field_id, key in mapped.items() if key != 'name'}
+        taken = set(field_keys.values())
+        for field_id, internal_key in mapped.items():
+            if internal_key == 'name':
+                # Generic "name" fields fill name1 first, then name2; further ones are ignored
+                internal_key = next((slot for slot in ('name1', 'name2') if slot not in taken), None)
+                taken.add(internal_key)
+                field_keys[field_id] = internal_key
+        
+        if form_id:
+            if form_id not in self._form_field_cache and len(self._form_field_cache) >= MAX_CACHED_FORMS:
+                self._form_field_cache.clear()
+            self._form_field_cache[form_id] = field_keys
+        
+        return field_keys
+    
+    def _map_tally_field(self, field_id: str, field_value: str = '') -> Optional[str]:
+        """Map Tally field ID to our internal field key.
+
+        Returns ``'name'`` for unrecognised name fields so the caller can
+        assign them to ``name1`` or ``name2``.
+        """
+        
+        # You can get the field IDs from your Tally form webhook test
         field_lower = field_id.lower()
         
-        for internal_key, possible_names in self.form_fields_mapping.items():
-            for name in possible_names:
-                if name in field_lower or field_lower in name:
-                    return internal_key
-        
-        # If no match found, try to guess based on field value content
-        if 'name' in field_lower:
-            return 'name1'  # We'll handle name2 in the conversion logic
-        elif 'place' in field_lower or 'where' in field_lower:
-            return 'setting'
-        elif 'meet' in field_lower or 'encounter' in field_lower:
-            return 'how_met'
-        elif 'interest' in field_lower or 'hobby' in field_lower:
-            return 'shared_interest'
-        elif 'challenge' in field_lower or 'obstacle' in field_lower:
-            return 'challenge'
-        elif 'special' in field_lower or 'unique' in field_lower:
-            return 'special_thing'
-        elif 'length' in field_lower or 'duration' in field_lower:
-            return 'story_length'
+        internal_key = self._exact_fields.get(field_lower)
+        if internal_key:
+            return internal_key
+        
+        # Known aliases contained in the field ID
+        match = self._alias_pattern.search(field_lower)
+        if match:
+            return self._exact_fields[match.group()]
+        
+        # If no alias matches, guess from common keywords
+        match = self._fallback_pattern.search(field_lower)
+        if match:
+            return self._fallback_keywords[match.group()]
         
         return None
     
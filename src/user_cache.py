@@ -0,0 +1,83 @@
+"""
+User Cache - Short-lived in-process cache behind the Flask-Login user loader
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.util import identity_key
+from src.user_models import db, User
+
+class UserCache:
+    """LRU cache of user column snapshots with a TTL.
+
+    Cached users are rebuilt and attached to the current session without a
+    query, so each request still gets its own ORM instance.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl_seconds: float = 30):
+        """Initialize the cache"""
+        self.max_size = max_size
+        self.ttl = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._columns = [attr.key for attr in db.inspect(User).column_attrs]
+
+    def load(self, user_id: int) -> Optional[User]:
+        """Return the user for this request, hitting the database only on a cache miss"""
+        key = identity_key(User, user_id)
+        user = db.session.identity_map.get(key)
+        if user is not None:
+            return user
+
+        snapshot = self._get(user_id)
+        if snapshot is None:
+            user = db.session.get(User, user_id)
+            if user is not None:
+                self._put(user_id, {name: getattr(user, name) for name in self._columns})
+            return user
+
+        # Rebuild a persistent instance from the snapshot without a SELECT
+        user = User(**snapshot)
+        make_transient_to_detached(user)
+        db.session.add(user)
+        return user
+
+    def invalidate(self, user_id: int) -> None:
+        """Drop a user so the next request reloads it from the database"""
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        """Drop every cached user"""
+        with self._lock:
+            self._entries.clear()
+
+    def _get(self, user_id: int) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires_at, snapshot = entry
+            if expires_at < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return snapshot
+
+    def _put(self, user_id: int, snapshot: dict) -> None:
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, snapshot)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+# Process-wide cache used by the user loader
+user_cache = UserCache()
+
+def invalidate_user(user_id) -> None:
+    """Invalidation hook for code paths that change a user's account or plan"""
+    if user_id is not None:
+        user_cache.invalidate(int(user_id))
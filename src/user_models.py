@@ -4,12 +4,57 @@ User Models - Handles user authentication and account management
 
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timedelta
 import uuid
+import zlib
+from src.plans import PLAN_STORY_LIMITS, story_limit, can_share_stories
+from src.password_hashing import password_hasher
 
 db = SQLAlchemy()
 
+class CompressedText(db.TypeDecorator):
+    """Text column stored zlib-compressed at rest.
+
+    Values written before compression was introduced (plain TEXT or raw UTF-8
+    bytes) are still read back transparently.
+    """
+    
+    impl = db.LargeBinary
+    cache_ok = True
+    
+    # Marks compressed values so they can be told apart from legacy rows
+    MAGIC = b'\x00zl1'
+    
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, str):
+            value = value.encode('utf-8')
+        return self.MAGIC + zlib.compress(value, 6)
+    
+    def result_processor(self, dialect, coltype):
+        def process(value):
+            if value is None or isinstance(value, str):
+                return value
+            return self.decompress(bytes(value))
+        return process
+    
+    @classmethod
+    def is_compressed(cls, value) -> bool:
+        """Check whether a raw column value is already compressed"""
+        return isinstance(value, (bytes, bytearray, memoryview)) and bytes(value[:len(cls.MAGIC)]) == cls.MAGIC
+    
+    @classmethod
+    def decompress(cls, value: bytes) -> str:
+        """Decode a raw column value"""
+        if value.startswith(cls.MAGIC):
+            value = zlib.decompress(value[len(cls.MAGIC):])
+        return value.decode('utf-8')
+
+def _month_start(moment):
+    """First instant of the month containing ``moment``"""
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
 class User(UserMixin, db.Model):
     """User model for authentication and account management"""
     
@@ -26,8 +71,8 @@ class User(UserMixin, db.Model):
     plan_end_date = db.Column(db.DateTime)
     
     # Stripe integration
-    stripe_customer_id = db.Column(db.String(100))
-    stripe_subscription_id = db.Column(db.String(100))
+    stripe_customer_id = db.Column(db.String(100), index=True)
+    stripe_subscription_id = db.Column(db.String(100), index=True)
     
     # Usage tracking
     stories_created = db.Column(db.Integer, default=0)
@@ -38,47 +83,87 @@ class User(UserMixin, db.Model):
     stories = db.relationship('Story', backref='user', lazy=True)
     
     def set_password(self, password):
-        """Hash and set password"""
-        self.password_hash = generate_password_hash(password)
+        """Hash and set password, raises HashingBusyError when the hashing pool is saturated"""
+        self.password_hash = password_hasher.hash(password)
     
     def check_password(self, password):
-        """Check if password is correct"""
-        return check_password_hash(self.password_hash, password)
+        """Check if password is correct, raises HashingBusyError when the hashing pool is saturated"""
+        return password_hasher.verify(self.password_hash, password)
     
     def can_create_story(self):
         """Check if user can create a new story based on their plan"""
-        if self.plan_type == 'free':
-            return self.stories_this_month < 1
-        elif self.plan_type == 'basic':
-            return self.stories_this_month < 3
-        elif self.plan_type == 'premium':
-            return self.stories_this_month < 10
-        elif self.plan_type == 'pro':
+        limit = self.get_plan_limits()
+        if limit < 0:
             return True  # Unlimited
-        return False
+        
+        used = 0 if self._is_new_month() else (self.stories_this_month or 0)
+        return used < limit
+    
+    def can_share_stories(self):
+        """Check if the user's plan includes public share links"""
+        return can_share_stories(self.plan_type)
     
     def get_plan_limits(self):
         """Get story limits for current plan"""
-        limits = {
-            'free': 1,
-            'basic': 3,
-            'premium': 10,
-            'pro': -1  # Unlimited
-        }
-        return limits.get(self.plan_type, 1)
+        return story_limit(self.plan_type)
+    
+    def _is_new_month(self):
+        """Check if the monthly story count belongs to an earlier month"""
+        return not self.last_story_date or self.last_story_date < _month_start(datetime.utcnow())
     
     def reset_monthly_usage(self):
         """Reset monthly story count if it's a new month"""
-        if not self.last_story_date or self.last_story_date.month != datetime.utcnow().month:
+        if self._is_new_month():
             self.stories_this_month = 0
             self.last_story_date = datetime.utcnow()
     
     def increment_story_count(self):
         """Increment story counters"""
-        self.reset_monthly_usage()
-        self.stories_created += 1
-        self.stories_this_month += 1
-        self.last_story_date = datetime.utcnow()
+        User.consume_story_quota(self.id, enforce_limit=False)
+    
+    @classmethod
+    def consume_story_quota(cls, user_id, enforce_limit=True):
+        """Atomically count one story against a user's monthly quota.
+
+        The month rollover, the limit check and both counters are handled
+        by a single conditional UPDATE, so concurrent generations cannot
+        exceed the plan limit. Returns False if the quota is used up.
+        """
+        now = datetime.utcnow()
+        table = cls.__table__
+        used = db.func.coalesce(table.c.stories_this_month, 0)
+        new_month = db.or_(table.c.last_story_date.is_(None), table.c.last_story_date < _month_start(now))
+        limit = db.case(
+            *[(table.c.plan_type == plan, plan_limit) for plan, plan_limit in PLAN_STORY_LIMITS.items()],
+            else_=story_limit(None)
+        )
+        
+        statement = db.update(table).where(table.c.id == user_id)
+        if enforce_limit:
+            statement = statement.where(db.or_(limit < 0, new_month, used < limit))
+        statement = statement.values(
+            stories_this_month=db.case((new_month, 1), else_=used + 1),
+            stories_created=db.func.coalesce(table.c.stories_created, 0) + 1,
+            last_story_date=now
+        ).returning(table.c.stories_this_month)
+        
+        consumed = db.session.execute(statement).first() is not None
+        db.session.commit()
+        return consumed
+    
+    @classmethod
+    def refund_story_quota(cls, user_id):
+        """Give back a story consumed for a generation that failed"""
+        table = cls.__table__
+        db.session.execute(
+            db.update(table)
+            .where(table.c.id == user_id)
+            .where(table.c.stories_this_month > 0)
+            .values(
+                stories_this_month=table.c.stories_this_month - 1,
+                stories_created=table.c.stories_created - 1
+            )
+        )
         db.session.commit()
 
 class Story(db.Model):
@@ -88,24 +173,59 @@ class Story(db.Model):
     story_id = db.Column(db.String(50), unique=True, nullable=False)  # The short ID used in URLs
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     title = db.Column(db.String(200))
-    story_text = db.Column(db.Text, nullable=False)
-    story_data = db.Column(db.JSON)  # Store form data as JSON
+    # Large columns are only loaded on the detail and download paths
+    story_text = db.deferred(db.Column(CompressedText, nullable=False))
+    story_data = db.deferred(db.Column(db.JSON))  # Store form data as JSON
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_public = db.Column(db.Boolean, default=False)
+    share_key = db.Column(db.String(64))  # Snapshot directory under data/shared while public
+    
+    __table_args__ = (
+        # Account dashboard and story history: newest stories of one user
+        db.Index('ix_story_user_id_created_at', user_id, created_at.desc(), id.desc()),
+    )
     
     def __init__(self, **kwargs):
         super(Story, self).__init__(**kwargs)
         if not self.story_id:
             self.story_id = str(uuid.uuid4())[:8]
+    
+    @classmethod
+    def get_with_content(cls, story_id: str):
+        """Load a story including its deferred text and form data in one query"""
+        return cls.query.options(db.undefer(cls.story_text), db.undefer(cls.story_data))\
+                        .filter_by(story_id=story_id).first()
 
 class UserSession(db.Model):
     """Track user sessions for analytics"""
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True, index=True)
     session_id = db.Column(db.String(100), unique=True, nullable=False)
     ip_address = db.Column(db.String(45))
     user_agent = db.Column(db.String(500))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     last_activity = db.Column(db.DateTime, default=datetime.utcnow)
-    is_active = db.Column(db.Boolean, default=True) 
\ No newline at end of file
+    is_active = db.Column(db.Boolean, default=True)
+
+class WebhookDelivery(db.Model):
+    """Track form webhook deliveries so retried deliveries don't regenerate stories"""
+    
+    delivery_key = db.Column(db.String(150), primary_key=True)  # "<source>:<responseId>"
+    status = db.Column(db.String(20), nullable=False, default='received')  # received, generating, done
+    job_id = db.Column(db.String(32))
+    story_url = db.Column(db.String(200))
+    download_url = db.Column(db.String(200))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+class StripeEvent(db.Model):
+    """Stripe webhook events, recorded on receipt so replays are no-ops"""
+    
+    event_id = db.Column(db.String(100), primary_key=True)
+    event_type = db.Column(db.String(100), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending', index=True)  # pending, processed, failed
+    payload = db.Column(db.JSON, nullable=False)
+    received_at = db.Column(db.DateTime, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime)
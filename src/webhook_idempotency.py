@@ -0,0 +1,84 @@
+"""
+Webhook Idempotency - Deduplicates retried form webhook deliveries
+"""
+
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy.exc import IntegrityError
+from src.user_models import db, WebhookDelivery
+
+class IdempotencyStore:
+    """Records each form response by ID so retried deliveries return the existing job or story.
+
+    A claim that is not done is a lease: once it has not been updated for
+    ``lease_seconds`` (e.g. the process died mid-generation) the next
+    delivery may claim it again.
+    """
+    
+    def __init__(self, ttl_seconds: int = 86400, purge_interval_seconds: int = 600, lease_seconds: int = 900):
+        """Initialize the store"""
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.lease = timedelta(seconds=lease_seconds)
+        self.purge_interval = timedelta(seconds=purge_interval_seconds)
+        self._last_purge = datetime.utcnow()
+    
+    def claim(self, delivery_key: str) -> Optional[WebhookDelivery]:
+        """Claim a delivery for processing.
+
+        Returns ``None`` if the caller now owns the delivery, or the existing
+        record if this delivery was already received.
+        """
+        now = datetime.utcnow()
+        self._purge_expired(now)
+        
+        delivery = db.session.get(WebhookDelivery, delivery_key)
+        if delivery and delivery.expires_at > now and (delivery.status == 'done' or delivery.updated_at > now - self.lease):
+            return delivery
+        
+        if delivery:
+            # Expired record or abandoned claim - start over, unless another delivery just did
+            removed = WebhookDelivery.query.filter_by(delivery_key=delivery_key, updated_at=delivery.updated_at)\
+                                           .delete(synchronize_session=False)
+            db.session.expunge(delivery)
+            if not removed:
+                db.session.rollback()
+                return db.session.get(WebhookDelivery, delivery_key)
+        
+        try:
+            db.session.add(WebhookDelivery(
+                delivery_key=delivery_key,
+                status='received',
+                created_at=now,
+                updated_at=now,
+                expires_at=now + self.ttl
+            ))
+            db.session.commit()
+            return None
+        except IntegrityError:
+            # A concurrent delivery of the same response won the race
+            db.session.rollback()
+            return db.session.get(WebhookDelivery, delivery_key)
+    
+    def mark(self, delivery_key: str, status: Optional[str] = None, **fields) -> None:
+        """Move a claimed delivery to a new state (received, generating, done) and/or update its fields"""
+        values = {'updated_at': datetime.utcnow()}
+        if status:
+            values['status'] = status
+        values.update({key: value for key, value in fields.items() if hasattr(WebhookDelivery, key)})
+        
+        WebhookDelivery.query.filter_by(delivery_key=delivery_key).update(values)
+        db.session.commit()
+    
+    def release(self, delivery_key: str) -> None:
+        """Forget a delivery whose generation failed so a retry can try again"""
+        WebhookDelivery.query.filter_by(delivery_key=delivery_key).delete()
+        db.session.commit()
+    
+    def _purge_expired(self, now: datetime) -> None:
+        """Delete expired records, at most once per purge interval"""
+        if now - self._last_purge < self.purge_interval:
+            return
+        
+        self._last_purge = now
+        WebhookDelivery.query.filter(WebhookDelivery.expires_at <= now).delete()
+        db.session.commit()
@@ -3,416 +3,425 @@
 Web Server for Love Story Generator - Handles Tally form webhooks
 """
 
-from flask import Flask, request, jsonify, render_template_string, render_template, flash, redirect, url_for
+# Imported first so startup timings cover the rest of the imports
+from src.startup_report import startup_report
+from flask import Flask, request, jsonify, render_template, flash, redirect, url_for, session, send_file
 from flask_login import LoginManager, login_required, current_user, login_user, logout_user
+from werkzeug.middleware.proxy_fix import ProxyFix
+from sqlalchemy import event
+from sqlalchemy.orm import Session as SessionBase, object_session
 import json
 import os
 import sys
+import hmac
+import signal
+import click
 import datetime
-from io import BytesIO
+import threading
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 # Import user models and auth
 from src.user_models import db, User, Story
 from src.auth import auth
-from src.payments import PaymentProcessor
-
-# PDF generation imports
-PDF_AVAILABLE = False
-try:
-    from reportlab.lib.pagesizes import A4
-    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib.colors import HexColor, Color
-    from reportlab.lib.units import inch
-    from reportlab.pdfgen import canvas
-    from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_JUSTIFY
-    PDF_AVAILABLE = True
-except ImportError:
-    # PDF generation will fall back to text files
-    pass
-
-# Helper function to safely create colors (defined globally)
-def safe_color(hex_code):
-    if not PDF_AVAILABLE:
-        return None
-    try:
-        return HexColor(hex_code)
-    except:
-        # Fallback to basic colors if HexColor fails
-        color_map = {
-            '#c44569': Color(0.77, 0.27, 0.41),  # Pink
-            '#667eea': Color(0.40, 0.49, 0.92),  # Blue
-            '#333333': Color(0.20, 0.20, 0.20),  # Dark gray
-            '#666666': Color(0.40, 0.40, 0.40),  # Gray
-            '#28a745': Color(0.16, 0.65, 0.27),  # Green
-        }
-        return color_map.get(hex_code, Color(0, 0, 0))  # Default to black
+from src.payments import payment_processor
+from src.plans import reload_plan_catalog_in_background
+from src.migrations import upgrade_database, backfill_story_text
+from src.reconcile import reconcile_subscriptions
+from src.user_cache import user_cache, invalidate_user
+from src.password_hashing import password_hasher
+from src.session_tracker import SessionActivityBuffer
 
 from src.story_generator import StoryGenerator
 from src.universal_generator import UniversalGenerator
 from src.tally_handler import TallyHandler
+from src.generation_queue import GenerationQueue
+from src.webhook_idempotency import IdempotencyStore
+from src.rate_limit import AdmissionController
+from src.static_assets import StaticAssets, RenderedPageCache
+from src.exporters import DEFAULT_FORMAT, EXPORTERS, ExportCache, document_cache, get_exporter
+from src.sharing import SNAPSHOT_FILES, render_story_html, snapshot_store
+from src.story_store import StoryStore
 from config.settings import Config
+startup_report.mark('imports')
+
+# Initialize components
+config = Config()
 
 app = Flask(__name__, static_folder='static')
+if config.trusted_proxy_hops:
+    # Use the client address forwarded by the hosting proxy for throttling
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=config.trusted_proxy_hops, x_proto=config.trusted_proxy_hops)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your-secret-key-change-this')
-app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///love_stories.db')
+app.config['SQLALCHEMY_DATABASE_URI'] = config.database_url
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = config.sqlalchemy_engine_options()
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
 # Initialize database and login manager
 db.init_app(app)
+with app.app_context():
+    config.configure_engine(db.engine)
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'auth.login'
+password_hasher.configure(config.password_hash_workers, config.password_hash_max_pending)
+startup_report.mark('database')
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return user_cache.load(int(user_id))
+
+# Buffered session analytics, written to UserSession in bulk
+session_activity = SessionActivityBuffer(
+    flush_interval=config.session_flush_interval,
+    flush_threshold=config.session_flush_events,
+    max_sessions=config.session_buffer_max
+)
+session_activity.init_app(app)
+
+_proxy_warning_logged = False
+
+@app.before_request
+def warn_untrusted_proxy():
+    """Warn once when requests arrive through a proxy whose client IPs are ignored"""
+    global _proxy_warning_logged
+    if not config.trusted_proxy_hops and not _proxy_warning_logged and 'X-Forwarded-For' in request.headers:
+        _proxy_warning_logged = True
+        print("WARNING: requests carry X-Forwarded-For but TRUSTED_PROXY_HOPS is 0, so every client shares "
+              "the proxy's IP in the rate limits. Set TRUSTED_PROXY_HOPS to the number of proxies in front of the app.")
+
+@app.before_request
+def track_session_activity():
+    """Record activity of signed-in sessions without a database write per request"""
+    if request.endpoint in ('static', 'health_check') or not current_user.is_authenticated:
+        return
+    
+    if 'sid' not in session:
+        import uuid
+        session['sid'] = uuid.uuid4().hex
+    session_activity.record(session['sid'], current_user.id, request.remote_addr, request.user_agent.string)
 
 # Register blueprints
 app.register_blueprint(auth, url_prefix='/auth')
 
-# Initialize components
-config = Config()
-
 # Validate API key before creating story generator
 if not config.openai_api_key:
     raise ValueError("OpenAI API key is required. Please set the OPENAI_API_KEY environment variable.")
 
-story_generator = StoryGenerator(
-    api_key=config.openai_api_key,
-    model_name=config.model_name,
-    max_tokens=config.max_tokens,
-    temperature=config.temperature
-)
-universal_generator = UniversalGenerator(
-    api_key=config.openai_api_key,
-    model_name=config.model_name,
-    max_tokens=config.max_tokens,
-    temperature=config.temperature
-)
+# Generators load the OpenAI SDK, so they are built by the first generation job
+_generators = {}
+_generators_lock = threading.Lock()
+
+def _get_generator(name, factory):
+    """Build a generator on first use, once per process"""
+    generator = _generators.get(name)
+    if generator is None:
+        with _generators_lock:
+            generator = _generators.get(name)
+            if generator is None:
+                generator = _generators[name] = factory()
+    return generator
+
+def get_story_generator():
+    """The love story generator"""
+    return _get_generator('story', lambda: StoryGenerator(
+        api_key=config.openai_api_key,
+        model_name=config.model_name,
+        max_tokens=config.max_tokens,
+        temperature=config.temperature,
+        track_prompt_cache=config.track_prompt_cache
+    ))
+
+def get_universal_generator():
+    """The generator for every other content type"""
+    return _get_generator('universal', lambda: UniversalGenerator(
+        api_key=config.openai_api_key,
+        model_name=config.model_name,
+        max_tokens=config.max_tokens,
+        temperature=config.temperature,
+        templates_dir=config.prompt_templates_dir or None
+    ))
+
 tally_handler = TallyHandler()
+generation_queue = GenerationQueue(workers=config.generation_workers, app=app,
+                                   max_per_tenant=config.generation_tenant_concurrency)
+webhook_deliveries = IdempotencyStore(ttl_seconds=config.webhook_idempotency_ttl,
+                                      lease_seconds=config.webhook_claim_lease)
+
+# Per-IP, per-user and per-plan token buckets in front of story generation
+generation_admission = AdmissionController(
+    ip_burst=config.admission_ip_burst,
+    ip_per_hour=config.admission_ip_per_hour,
+    plan_per_minute=config.admission_plan_per_minute,
+    unlimited_burst=config.admission_unlimited_burst,
+    redis_url=config.rate_limit_redis_url or None
+)
 
-# HTML template for displaying the story
-STORY_TEMPLATE = """
-<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Your Story - Told with Love</title>
-    <style>
-        body {
-            font-family: 'Georgia', serif;
-            line-height: 1.6;
-            max-width: 800px;
-            margin: 0 auto;
-            padding: 20px;
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            min-height: 100vh;
-        }
-        .story-container {
-            background: white;
-            padding: 40px;
-            border-radius: 15px;
-            box-shadow: 0 10px 30px rgba(0,0,0,0.2);
-            margin: 20px 0;
-        }
-        .story-title {
-            text-align: center;
-            color: #333;
-            font-size: 2.5em;
-            margin-bottom: 30px;
-            font-weight: 300;
-        }
-        .story-content {
-            font-size: 1.1em;
-            color: #444;
-            text-align: justify;
-            white-space: pre-wrap;
-        }
-        .story-meta {
-            background: #f8f9fa;
-            padding: 20px;
-            border-radius: 10px;
-            margin-top: 30px;
-            border-left: 4px solid #667eea;
-        }
-        .meta-title {
-            font-weight: bold;
-            color: #333;
-            margin-bottom: 10px;
-        }
-        .download-btn {
-            display: inline-block;
-            background: #667eea;
-            color: white;
-            padding: 12px 24px;
-            text-decoration: none;
-            border-radius: 25px;
-            margin-top: 20px;
-            transition: background 0.3s;
-        }
-        .download-btn:hover {
-            background: #5a6fd8;
-        }
-        .error {
-            background: #ffe6e6;
-            color: #d63031;
-            padding: 20px;
-            border-radius: 10px;
-            border-left: 4px solid #d63031;
-        }
-    </style>
-</head>
-<body>
-    <div class="story-container">
-        <h1 class="story-title">❤️ Your Story ❤️</h1>
-        <div class="story-content">{{ story_content }}</div>
-        
-        <div class="story-meta">
-            <div class="meta-title">Story Details:</div>
-            <p><strong>Characters:</strong> {{ name1 }} & {{ name2 }}</p>
-            <p><strong>Setting:</strong> {{ setting }}</p>
-            <p><strong>How they met:</strong> {{ how_met }}</p>
-            <p><strong>Generated on:</strong> {{ generated_at }}</p>
-        </div>
-        
-        <a href="/download/{{ story_id }}" class="download-btn">📥 Download PDF</a>
-    </div>
-</body>
-</html>
-"""
+# Stripe events are applied one at a time, in order of receipt
+billing_queue = GenerationQueue(workers=1, app=app)
+
+# Landing page and forms are rendered and compressed once at startup
+static_pages = StaticAssets(max_age=config.static_max_age)
+static_pages.add('home.html', app.jinja_env.get_template('home.html').render())
+for form_page in ('love_form.html', 'universal_form.html'):
+    static_pages.add_file(form_page, os.path.join(app.static_folder, form_page))
+
+# Compile the story template now rather than on the first story view
+app.jinja_env.get_template('story.html')
+
+# Share link snapshots are immutable, so browsers and CDNs may keep them for a year
+SHARE_MAX_AGE = 365 * 24 * 3600
+
+# Exported story files on disk, shared by every download of the same story
+export_cache = ExportCache(max_files=config.export_cache_max_files)
+
+# Durable story lookup with a hot cache in front
+story_store = StoryStore(hot_size=config.story_hot_cache_size, ttl=config.story_cache_ttl)
+
+# Rendered story pages, keyed by story ID
+story_pages = RenderedPageCache(max_entries=config.story_page_cache_size, ttl=config.story_cache_ttl)
+startup_report.mark('components')
+
+def _mark_story_changed(mapper, connection, story):
+    """Remember edited stories until their transaction commits"""
+    object_session(story).info.setdefault('changed_story_ids', set()).add(story.story_id)
+
+def _invalidate_changed_story_pages(session):
+    """Drop cached copies of stories changed by the committed transaction"""
+    for story_id in session.info.pop('changed_story_ids', ()):
+        story_store.invalidate(story_id)
+        story_pages.invalidate(story_id)
+
+event.listen(Story, 'after_update', _mark_story_changed)
+event.listen(Story, 'after_delete', _mark_story_changed)
+event.listen(SessionBase, 'after_commit', _invalidate_changed_story_pages)
+event.listen(SessionBase, 'after_rollback', lambda session: session.info.pop('changed_story_ids', None))
 
 @app.route('/')
 def home():
     """Home page with information about the service"""
-    return """
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>✨ Story Generator</title>
-        <style>
-            body { 
-                font-family: 'Georgia', serif; 
-                max-width: 800px; 
-                margin: 50px auto; 
-                padding: 20px; 
-                background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                min-height: 100vh;
-            }
-            .nav {
-                background: white;
-                padding: 15px 30px;
-                border-radius: 15px;
-                margin-bottom: 20px;
-                box-shadow: 0 5px 15px rgba(0,0,0,0.1);
-                display: flex;
-                justify-content: space-between;
-                align-items: center;
-            }
-            .nav-brand {
-                font-size: 1.5em;
-                font-weight: bold;
-                color: #333;
-                text-decoration: none;
-            }
-            .nav-links {
-                display: flex;
-                gap: 20px;
-            }
-            .nav-links a {
-                color: #667eea;
-                text-decoration: none;
-                padding: 8px 16px;
-                border-radius: 20px;
-                transition: all 0.3s ease;
-            }
-            .nav-links a:hover {
-                background: #667eea;
-                color: white;
-            }
-            .nav-links .btn-login {
-                background: linear-gradient(135deg, #ff6b9d 0%, #c44569 100%);
-                color: white;
-            }
-            .nav-links .btn-login:hover {
-                transform: translateY(-2px);
-                box-shadow: 0 5px 15px rgba(255, 107, 157, 0.3);
-            }
-            .container { 
-                background: white; 
-                padding: 40px; 
-                border-radius: 20px; 
-                box-shadow: 0 20px 40px rgba(0,0,0,0.1);
-                text-align: center;
-            }
-            h1 {
-                color: #333;
-                font-size: 2.5em;
-                margin-bottom: 20px;
-                font-weight: 300;
-            }
-            p {
-                color: #666;
-                font-size: 1.1em;
-                line-height: 1.6;
-                margin-bottom: 15px;
-            }
-            .features {
-                display: flex;
-                justify-content: space-around;
-                margin: 30px 0;
-                flex-wrap: wrap;
-            }
-            .feature {
-                flex: 1;
-                min-width: 200px;
-                margin: 10px;
-                padding: 20px;
-                background: #f8f9fa;
-                border-radius: 15px;
-                border-left: 4px solid #667eea;
-            }
-            .feature h3 {
-                color: #333;
-                margin-bottom: 10px;
-            }
-            .btn { 
-                display: inline-block; 
-                background: linear-gradient(135deg, #ff6b9d 0%, #c44569 100%); 
-                color: white; 
-                padding: 18px 40px; 
-                text-decoration: none; 
-                border-radius: 50px; 
-                margin: 20px 10px; 
-                font-size: 18px;
-                font-weight: bold;
-                transition: all 0.3s ease;
-            }
-            .btn:hover {
-                transform: translateY(-2px);
-                box-shadow: 0 10px 20px rgba(255, 107, 157, 0.3);
-            }
-            .status {
-                background: #d4edda;
-                color: #155724;
-                padding: 15px;
-                border-radius: 10px;
-                margin: 20px 0;
-                border-left: 4px solid #28a745;
-            }
-            .content-types {
-                display: grid;
-                grid-template-columns: repeat(auto-fit, minmax(150px, 1fr));
-                gap: 15px;
-                margin: 30px 0;
-            }
-            .content-type {
-                background: #f8f9fa;
-                padding: 15px;
-                border-radius: 10px;
-                border: 2px solid #e9ecef;
-                transition: all 0.3s ease;
-                text-decoration: none;
-                color: #333;
-                display: block;
-            }
-            .content-type:hover {
-                border-color: #667eea;
-                transform: translateY(-2px);
-                background: #e3f2fd;
-                color: #667eea;
-            }
-        </style>
-    </head>
-    <body>
-        <div class="nav">
-            <a href="/" class="nav-brand">✨ Story Generator</a>
-            <div class="nav-links">
-                <a href="/love-form">Love Stories</a>
-                <a href="/universal-form">All Content</a>
-                <a href="/auth/login">Login</a>
-                <a href="/auth/register" class="btn-login">Sign Up</a>
-            </div>
-        </div>
-        
-        <div class="container">
-            <h1>✨ Story Generator ✨</h1>
-            <p>Create personalized content for any occasion - from love stories to speeches, eulogies to toasts.</p>
-            <p>Share your memories and we'll craft meaningful, heartfelt content just for you.</p>
-            
-            <div class="status">
-                <strong>✨ Ready to create your content!</strong>
-                <p style="margin-top: 10px; font-size: 0.9em;">Create beautiful, personalized content for free!</p>
-            </div>
-            
-            <div class="content-types">
-                <a href="/universal-form?type=love_story" class="content-type">💕 Love Stories</a>
-                <a href="/universal-form?type=wedding_speech" class="content-type">💒 Wedding Speeches</a>
-                <a href="/universal-form?type=eulogy" class="content-type">🙏 Eulogies</a>
-                <a href="/universal-form?type=birthday_speech" class="content-type">🎂 Birthday Speeches</a>
-                <a href="/universal-form?type=anniversary_speech" class="content-type">💝 Anniversary Speeches</a>
-                <a href="/universal-form?type=graduation_speech" class="content-type">🎓 Graduation Speeches</a>
-                <a href="/universal-form?type=retirement_speech" class="content-type">👔 Retirement Speeches</a>
-                <a href="/universal-form?type=toast" class="content-type">🥂 Toasts</a>
-                <a href="/universal-form?type=tribute" class="content-type">🏆 Tributes</a>
-                <a href="/universal-form?type=custom" class="content-type">✨ Custom Content</a>
-            </div>
-            
-            <div class="features">
-                <div class="feature">
-                    <h3>🎨 Personalized</h3>
-                    <p>Every piece is unique, crafted from your real experiences and memories.</p>
-                </div>
-                <div class="feature">
-                    <h3>💝 Meaningful</h3>
-                    <p>Beautiful, heartfelt content that captures the essence of your relationships.</p>
-                </div>
-                <div class="feature">
-                    <h3>💾 Downloadable</h3>
-                    <p>Save your content as a beautiful PDF to keep forever and share with loved ones.</p>
-                </div>
-            </div>
-            
-            <a href="/universal-form" class="btn">✨ Create Any Content</a>
-            <br>
-            <a href="/love-form" style="color: #667eea; text-decoration: none; font-size: 0.9em;">Just want a love story?</a>
-            <br>
-            <a href="/auth/register" style="color: #667eea; text-decoration: none; font-size: 0.9em;">Sign up to save your content</a>
-        </div>
-    </body>
-    </html>
-    """
-
-
+    return static_pages.response('home.html')
 
 @app.route('/love-form')
 def love_form():
     """Serve the love story form"""
-    return app.send_static_file('love_form.html')
+    return static_pages.response('love_form.html')
 
 @app.route('/universal-form')
 def universal_form():
     """Serve the universal story generator form"""
-    return app.send_static_file('universal_form.html')
+    return static_pages.response('universal_form.html')
 
-@app.route('/webhook/tally', methods=['POST'])
-def tally_webhook():
-    """Handle incoming Tally form webhooks"""
-    
-    # Create debug log file
+def _get_webhook_logger():
+    """Create the debug log file logger used by the webhook handlers"""
     import logging
     logging.basicConfig(
         filename='debug.log',
         level=logging.DEBUG,
         format='%(asctime)s - %(levelname)s - %(message)s'
     )
+    return logging.getLogger(__name__)
+
+def _generate_love_story(story_data):
+    """Generation job: write a love story for one Tally response and store it"""
+    import uuid
+    import logging
     logger = logging.getLogger(__name__)
     
+    # Generate the story using ChatGPT
+    logger.info(f"Starting story generation for {story_data.get('submission_id', '')}...")
+    story_text = get_story_generator().generate_story(story_data)
+    
+    if not story_text:
+        raise RuntimeError('Failed to generate story')
+    
+    # Save the submission and story
+    filename = tally_handler.save_submission(story_data, story_text)
+    logger.info(f"Saved to file: {filename}")
+    
+    # Create a unique story ID for the URL; submission IDs come from the client and
+    # can repeat (the love form sends "response_<timestamp>"), so they are not used
+    story_id = f"story_{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:6]}"
+    
+    # Persist the story so every worker can serve it, also after a restart
+    story_store.save(story_id, story_text, story_data)
+    story_pages.invalidate(story_id)
+    logger.info(f"Stored story {story_id}")
+    
+    return {
+        'story_url': f'/story/{story_id}',
+        'download_url': f'/download/{story_id}'
+    }
+
+def _generate_universal_content(form_data):
+    """Generation job: write universal content for one form response and store it"""
+    import uuid
+    import logging
+    logger = logging.getLogger(__name__)
+    
+    # Generate content using universal generator
+    logger.info(f"Starting content generation for {form_data.get('submission_id', '')}...")
+    content_text = get_universal_generator().generate_content(form_data)
+    
+    if not content_text:
+        raise RuntimeError('Failed to generate content')
+    
+    # Create a unique content ID for the URL
+    content_id = f"content_{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:6]}"
+    
+    # Persist the content so every worker can serve it, also after a restart
+    story_store.save(content_id, content_text, form_data)
+    story_pages.invalidate(content_id)
+    logger.info(f"Stored content {content_id}")
+    
+    return {
+        'story_url': f'/story/{content_id}',
+        'download_url': f'/download/{content_id}'
+    }
+
+def _run_delivery(delivery_key, generate, data, user_id=None):
+    """Generation job wrapper that records progress in the idempotency store"""
+    if delivery_key:
+        webhook_deliveries.mark(delivery_key, 'generating')
+    
+    try:
+        result = generate(data)
+    except Exception:
+        if delivery_key:
+            webhook_deliveries.release(delivery_key)
+        if user_id:
+            User.refund_story_quota(user_id)
+            invalidate_user(user_id)
+        raise
+    
+    if delivery_key:
+        webhook_deliveries.mark(delivery_key, 'done', **result)
+    return result
+
+def _enqueue_delivery(source, data, generate, results, jobs, verified=False):
+    """Enqueue one form response unless it was already delivered, recording its status.
+
+    ``verified`` deliveries come signed from the form provider on behalf of
+    many respondents, so they are not limited by the sender's IP.
+    """
+    record = {'submission_id': data.get('submission_id', '')}
+    delivery_key = f"{source}:{record['submission_id']}" if record['submission_id'] else None
+    user_id = current_user.id if current_user.is_authenticated else None
+    
+    existing = webhook_deliveries.claim(delivery_key) if delivery_key else None
+    if existing:
+        # Retried delivery - report the existing job or story as it stands right now,
+        # without generating again or waiting for the job
+        record.update({'duplicate': True, 'status': 'queued' if existing.status == 'received' else existing.status})
+        if existing.story_url:
+            record.update({'story_url': existing.story_url, 'download_url': existing.download_url})
+        
+        job = generation_queue.get(existing.job_id) if existing.job_id else None
+        if job:
+            record.update(job.to_dict())
+        elif existing.job_id:
+            record['job_id'] = existing.job_id
+        results.append(record)
+        return
+    
+    # Every new generation must be admitted before it can spend OpenAI capacity
+    client_ip = None if verified else request.remote_addr
+    retry_after = generation_admission.admit(client_ip, current_user if user_id else None)
+    if retry_after:
+        if delivery_key:
+            webhook_deliveries.release(delivery_key)
+        results.append({**record, 'status': 'rate_limited', 'error': 'Too many requests, please try again later',
+                        'retry_after': retry_after})
+        return
+    
+    # Signed-in users spend one story of their monthly plan quota per response
+    if user_id and not User.consume_story_quota(user_id):
+        invalidate_user(user_id)
+        if delivery_key:
+            webhook_deliveries.release(delivery_key)
+        results.append({**record, 'status': 'quota_exceeded', 'error': 'Monthly story limit reached for your plan'})
+        return
+    
+    if user_id:
+        invalidate_user(user_id)
+    
+    # Jobs are scheduled by plan tier; a user, anonymous client IP or verified respondent is one tenant
+    tier = current_user.plan_type if user_id else 'anonymous'
+    if user_id:
+        tenant = f'user:{user_id}'
+    elif verified:
+        tenant = f"{source}:{record['submission_id']}"
+    else:
+        tenant = f'ip:{request.remote_addr}'
+    job = generation_queue.submit(_run_delivery, delivery_key, generate, data, user_id, tier=tier, tenant=tenant)
+    if delivery_key:
+        webhook_deliveries.mark(delivery_key, job_id=job.job_id)
+    jobs[job.job_id] = job
+    results.append({**record, 'job_id': job.job_id})
+
+def _batch_response(results, jobs, message, wait=True):
+    """Wait for a webhook's generation jobs and build the per-record JSON response.
+
+    With ``wait`` off the response reports the jobs as queued (202) right away.
+    """
+    if wait:
+        generation_queue.wait_all(jobs.values(), timeout=config.generation_wait_timeout)
+    
+    records = []
+    for record in results:
+        job = jobs.get(record.get('job_id'))
+        records.append({**record, **job.to_dict()} if job else record)
+    
+    response_data = {
+        'success': any(record['status'] == 'done' for record in records),
+        'results': records
+    }
+    if response_data['success']:
+        response_data['message'] = message
+    
+    # Top-level URLs of the first finished record, as expected by the forms
+    for record in records:
+        if record['status'] == 'done':
+            response_data['story_url'] = record['story_url']
+            response_data['download_url'] = record['download_url']
+            break
+    
+    if response_data['success']:
+        return jsonify(response_data)
+    if any(record['status'] in ('queued', 'generating') for record in records):
+        return jsonify(response_data), 202
+    
+    response_data['error'] = records[0].get('error', 'Failed to process webhook data')
+    statuses = {record['status'] for record in records}
+    if statuses == {'invalid'}:
+        status = 400
+    elif statuses == {'quota_exceeded'}:
+        status = 403
+    elif 'rate_limited' in statuses and statuses <= {'rate_limited', 'invalid', 'quota_exceeded'}:
+        retry_after = max(record.get('retry_after', 0) for record in records)
+        return jsonify(response_data), 429, {'Retry-After': str(retry_after)}
+    else:
+        status = 500
+    return jsonify(response_data), status
+
+@app.route('/webhook/tally', methods=['POST'])
+def tally_webhook():
+    """Handle incoming Tally form webhooks"""
+    
+    logger = _get_webhook_logger()
+    
     try:
         logger.info("=== NEW WEBHOOK REQUEST ===")
         
+        # Signed deliveries come from Tally on behalf of many respondents; unsigned
+        # ones (e.g. the site's own love form) are limited by client IP as usual
+        signature = request.headers.get('Tally-Signature', '')
+        verified = False
+        if signature and config.tally_signing_secret:
+            if not tally_handler.verify_signature(request.get_data(), signature, config.tally_signing_secret):
+                logger.error("Invalid Tally webhook signature")
+                return jsonify({'error': 'Invalid signature'}), 401
+            verified = True
+        
         # Get the webhook data
         webhook_data = request.get_json()
         logger.info(f"Received webhook data: {webhook_data is not None}")
@@ -424,72 +433,28 @@ def tally_webhook():
         logger.info(f"Webhook data keys: {list(webhook_data.keys())}")
         print(f"Received Tally webhook: {json.dumps(webhook_data, indent=2)}")
         
-        # Process the webhook data
-        logger.info("Processing webhook data...")
-        story_data = tally_handler.process_tally_webhook(webhook_data)
-        logger.info(f"Processed story data: {story_data}")
+        # Enqueue one generation job per form response
+        results = []
+        jobs = {}
+        for story_data in tally_handler.process_tally_webhook(webhook_data):
+            record = {'submission_id': story_data.get('submission_id', '')}
+            
+            if not tally_handler.validate_story_data(story_data):
+                logger.error(f"Story data validation failed for {record['submission_id']}")
+                results.append({**record, 'status': 'invalid', 'error': 'Missing required fields'})
+                continue
+            
+            _enqueue_delivery('tally', story_data, _generate_love_story, results, jobs, verified)
+        
+        logger.info(f"Processed {len(results)} form responses, {len(jobs)} queued for generation")
         
-        if not story_data:
+        if not results:
             logger.error("Failed to process webhook data")
             return jsonify({'error': 'Failed to process webhook data'}), 400
         
-        # Validate the story data
-        logger.info("Validating story data...")
-        if not tally_handler.validate_story_data(story_data):
-            logger.error("Story data validation failed")
-            return jsonify({'error': 'Missing required fields'}), 400
-        
-        logger.info("Story data validated successfully")
-        
-        # Generate the story using ChatGPT
-        logger.info("Starting story generation...")
-        story_text = story_generator.generate_story(story_data)
-        logger.info(f"Story generation result: {story_text is not None}")
-        
-        if not story_text:
-            logger.error("Failed to generate story")
-            return jsonify({'error': 'Failed to generate story'}), 500
-        
-        logger.info("Story generated successfully")
-        
-        # Save the submission and story
-        logger.info("Saving submission...")
-        filename = tally_handler.save_submission(story_data, story_text)
-        logger.info(f"Saved to file: {filename}")
-        
-        # Create a unique story ID for the URL
-        story_id = story_data.get('submission_id', '')[:8]
-        if not story_id:
-            from datetime import datetime
-            story_id = datetime.now().strftime("%Y%m%d%H%M")
-        
-        # Clean the story ID to remove any special characters
-        import re
-        story_id = re.sub(r'[^a-zA-Z0-9]', '', story_id)
-        if not story_id:
-            story_id = 'story_' + datetime.now().strftime("%Y%m%d%H%M")
-        
-        logger.info(f"Created story ID: {story_id}")
-        
-        # Store the story temporarily (in production, use a database)
-        story_storage[story_id] = {
-            'story_text': story_text,
-            'story_data': story_data,
-            'filename': filename
-        }
-        
-        logger.info("Story stored in memory successfully")
-        
-        # Return success response
-        response_data = {
-            'success': True,
-            'message': 'Story generated successfully',
-            'story_url': f'/story/{story_id}',
-            'download_url': f'/download/{story_id}'
-        }
-        logger.info(f"Returning success response: {response_data}")
-        
-        return jsonify(response_data)
+        # Tally's servers retry slow deliveries, so they are answered without waiting;
+        # the love form waits to show the finished story
+        return _batch_response(results, jobs, 'Story generated successfully', wait=not verified)
         
     except Exception as e:
         logger.error(f"Exception occurred: {str(e)}", exc_info=True)
@@ -500,14 +465,7 @@ def tally_webhook():
 def universal_webhook():
     """Handle universal form submissions"""
     
-    # Create debug log file
-    import logging
-    logging.basicConfig(
-        filename='debug.log',
-        level=logging.DEBUG,
-        format='%(asctime)s - %(levelname)s - %(message)s'
-    )
-    logger = logging.getLogger(__name__)
+    logger = _get_webhook_logger()
     
     try:
         logger.info("=== NEW UNIVERSAL WEBHOOK REQUEST ===")
@@ -523,310 +481,207 @@ def universal_webhook():
         logger.info(f"Universal webhook data keys: {list(webhook_data.keys())}")
         print(f"Received universal webhook: {json.dumps(webhook_data, indent=2)}")
         
-        # Extract form data from webhook
-        form_data = {}
-        try:
-            answers = webhook_data['eventBody']['event']['formResponses'][0]['answers']
-            for answer in answers:
-                form_data[answer['fieldId']] = answer['value']
-        except (KeyError, IndexError) as e:
-            logger.error(f"Failed to extract form data: {e}")
-            return jsonify({'error': 'Invalid form data format'}), 400
-        
-        logger.info(f"Extracted form data: {form_data}")
-        
-        # Validate required fields
+        # Validate and enqueue one generation job per form response
         required_fields = ['content_type', 'tone', 'speaker_name', 'recipient_name', 'relationship', 'occasion', 'key_memories', 'traits', 'length']
-        missing_fields = [field for field in required_fields if not form_data.get(field)]
-        
-        if missing_fields:
-            logger.error(f"Missing required fields: {missing_fields}")
-            return jsonify({'error': f'Missing required fields: {", ".join(missing_fields)}'}), 400
-        
-        logger.info("Form data validated successfully")
-        
-        # Generate content using universal generator
-        logger.info("Starting content generation...")
-        content_text = universal_generator.generate_content(form_data)
-        logger.info(f"Content generation result: {content_text is not None}")
-        
-        if not content_text:
-            logger.error("Failed to generate content")
-            return jsonify({'error': 'Failed to generate content'}), 500
-        
-        logger.info("Content generated successfully")
-        
-        # Create a unique content ID for the URL
-        from datetime import datetime
-        import re
-        content_id = f"content_{datetime.now().strftime('%Y%m%d%H%M%S')}"
-        
-        logger.info(f"Created content ID: {content_id}")
-        
-        # Store the content temporarily (in production, use a database)
-        story_storage[content_id] = {
-            'story_text': content_text,
-            'story_data': form_data,
-            'filename': f'universal_{content_id}.json'
-        }
+        results = []
+        jobs = {}
+        for form_data in tally_handler.process_universal_webhook(webhook_data):
+            record = {'submission_id': form_data.get('submission_id', '')}
+            missing_fields = [field for field in required_fields if not form_data.get(field)]
+            
+            if missing_fields:
+                logger.error(f"Missing required fields: {missing_fields}")
+                results.append({**record, 'status': 'invalid', 'error': f'Missing required fields: {", ".join(missing_fields)}'})
+                continue
+            
+            _enqueue_delivery('universal', form_data, _generate_universal_content, results, jobs)
         
-        logger.info("Content stored in memory successfully")
+        logger.info(f"Processed {len(results)} form responses, {len(jobs)} queued for generation")
         
-        # Return success response
-        response_data = {
-            'success': True,
-            'message': 'Content generated successfully',
-            'story_url': f'/story/{content_id}',
-            'download_url': f'/download/{content_id}'
-        }
-        logger.info(f"Returning success response: {response_data}")
+        if not results:
+            logger.error("Failed to extract form data")
+            return jsonify({'error': 'Invalid form data format'}), 400
         
-        return jsonify(response_data)
+        return _batch_response(results, jobs, 'Content generated successfully')
         
     except Exception as e:
         logger.error(f"Exception occurred: {str(e)}", exc_info=True)
         print(f"Error processing universal webhook: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Report the status of a generation job"""
+    job = generation_queue.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
 @app.route('/story/<story_id>')
 def display_story(story_id):
     """Display the generated story"""
     
-    # First check in-memory storage
-    if story_id in story_storage:
-        story_info = story_storage[story_id]
-        story_text = story_info['story_text']
-        story_data = story_info['story_data']
-    else:
-        # Try to load from saved file
-        import json
-        import os
-        import glob
-        
-        # Look for saved files
-        saved_files = glob.glob('data/submission_*.json')
-        for file_path in saved_files:
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    saved_data = json.load(f)
-                    if saved_data.get('submission_data', {}).get('submission_id', '').startswith(story_id):
-                        story_text = saved_data.get('story_text', 'Story not found')
-                        story_data = saved_data.get('submission_data', {})
-                        break
-            except:
-                continue
-        else:
-            return "Story not found", 404
-    
-    return render_template_string(STORY_TEMPLATE,
-        story_content=story_text,
-        name1=story_data.get('name1', 'Unknown'),
-        name2=story_data.get('name2', 'Unknown'),
-        setting=story_data.get('setting', 'Unknown'),
-        how_met=story_data.get('how_met', 'Unknown'),
-        generated_at=story_data.get('submitted_at', 'Unknown'),
-        story_id=story_id
-    )
-
-@app.route('/download/<story_id>')
-def download_story(story_id):
-    """Download the story as a beautiful PDF file"""
-    
-    if story_id not in story_storage:
+    # Checked before the page cache, private account stories are only shown to their owner
+    story = story_store.get(story_id, current_user.id if current_user.is_authenticated else None)
+    if story is None:
         return "Story not found", 404
     
-    story_info = story_storage[story_id]
-    story_text = story_info['story_text']
-    story_data = story_info['story_data']
+    cached_page = story_pages.get(story_id)
+    if cached_page is not None:
+        return story_pages.serve(cached_page)
     
-    # Check if PDF generation is available
-    if not PDF_AVAILABLE:
-        # Fallback to text file if PDF generation is not available
-        from flask import Response
-        download_content = f"""TOLD WITH LOVE
+    html = render_story_html(story_id, story['story_text'], story['story_data'], f'/download/{story_id}')
+    return story_pages.serve(story_pages.add(story_id, html, 'text/html'))
 
-Characters: {story_data.get('name1', 'Unknown')} & {story_data.get('name2', 'Unknown')}
-How they met: {story_data.get('how_met', 'Unknown')}
-Favorite memory: {story_data.get('favorite_memory', 'Unknown')}
-Generated: {datetime.datetime.now().strftime('%B %d, %Y at %I:%M %p')}
-
-{story_text}
-
----
-This love story was created with love by Told with Love
-Generated on {datetime.datetime.now().strftime('%B %d, %Y')}
-Story ID: {story_id}
-"""
-        response = Response(download_content, mimetype='text/plain')
-        response.headers['Content-Disposition'] = f'attachment; filename=told_with_love_{story_id}.txt'
-        return response
-    
-    # Generate beautiful PDF with enhanced design
-    
-    # Create PDF in memory
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=50, leftMargin=50, topMargin=50, bottomMargin=50)
-    
-    # Create story elements
-    story_elements = []
-    
-    # Custom styles with better fonts and colors
-    styles = getSampleStyleSheet()
-    
-    # Enhanced title style with decorative elements
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=36,
-        spaceAfter=40,
-        alignment=TA_CENTER,
-        textColor=safe_color('#e91e63') or Color(0.91, 0.12, 0.39),  # Bright pink
-        fontName='Helvetica-Bold',
-        leading=40
-    )
-    
-    # Subtitle style for story details
-    subtitle_style = ParagraphStyle(
-        'CustomSubtitle',
-        parent=styles['Heading2'],
-        fontSize=16,
-        spaceAfter=25,
-        alignment=TA_CENTER,
-        textColor=safe_color('#3f51b5') or Color(0.25, 0.32, 0.71),  # Indigo
-        fontName='Helvetica-Bold',
-        leading=20
-    )
-    
-    # Enhanced story text style with better readability
-    story_style = ParagraphStyle(
-        'CustomStory',
-        parent=styles['Normal'],
-        fontSize=13,
-        spaceAfter=16,
-        alignment=TA_JUSTIFY,
-        textColor=safe_color('#2c3e50') or Color(0.17, 0.24, 0.31),  # Dark blue-gray
-        fontName='Helvetica',
-        leading=20,
-        firstLineIndent=20
-    )
-    
-    # Meta info style for story details
-    meta_style = ParagraphStyle(
-        'CustomMeta',
-        parent=styles['Normal'],
-        fontSize=11,
-        spaceAfter=10,
-        alignment=TA_LEFT,
-        textColor=safe_color('#7f8c8d') or Color(0.50, 0.55, 0.55),  # Gray
-        fontName='Helvetica'
-    )
+@app.route('/download/<story_id>')
+@app.route('/download/<story_id>/<export_format>')
+def download_story(story_id, export_format=DEFAULT_FORMAT):
+    """Download the story as a beautiful PDF file, or as EPUB, DOCX, Markdown or text"""
     
-    # Decorative header with proper heart symbols
-    header_text = "♥ Your Love Story ♥"
-    story_elements.append(Paragraph(header_text, title_style))
-    story_elements.append(Spacer(1, 20))
-    
-    # Extract the creative title from the story (first line)
-    story_lines = story_text.split('\n')
-    creative_title = story_lines[0].strip() if story_lines else "A Love Story"
-    # Clean up any markdown formatting (asterisks, etc.)
-    creative_title = creative_title.replace('*', '').replace('**', '').strip()
-    
-    # Display the creative title
-    story_elements.append(Paragraph(creative_title, subtitle_style))
-    story_elements.append(Spacer(1, 30))
-
-    # Add decorative separator
-    separator_style = ParagraphStyle(
-        'Separator',
-        parent=styles['Normal'],
-        fontSize=16,
-        alignment=TA_CENTER,
-        textColor=safe_color('#e91e63') or Color(0.91, 0.12, 0.39),
-        spaceAfter=20,
-        spaceBefore=20
-    )
-    story_elements.append(Paragraph("♥ ♥ ♥", separator_style))
-    story_elements.append(Spacer(1, 20))
-
-    # Add the full story text with proper heart symbol handling (skip the first line which is the title)
-    story_lines = story_text.split('\n')
-    story_content = '\n'.join(story_lines[1:])  # Skip the first line (title)
-    
-    paragraphs = story_content.split('\n\n')
-    for paragraph in paragraphs:
-        if paragraph.strip():
-            # Clean up markdown and replace heart symbols properly
-            clean_paragraph = paragraph.strip().replace('**', '').replace('💕', '♥').replace('❤️', '♥').replace('💖', '♥')
-            story_elements.append(Paragraph(clean_paragraph, story_style))
-            story_elements.append(Spacer(1, 16))
-    
-    # Add footer with decorative elements
-    footer_style = ParagraphStyle(
-        'Footer',
-        parent=styles['Normal'],
-        fontSize=10,
-        alignment=TA_CENTER,
-        textColor=safe_color('#6c757d') or Color(0.42, 0.46, 0.49),
-        spaceBefore=30
-    )
+    exporter = get_exporter(export_format)
+    if exporter is None:
+        return jsonify({'error': f'Unsupported format, choose one of: {", ".join(EXPORTERS)}'}), 404
     
-    footer_text = f"♥ Generated with love on {datetime.datetime.now().strftime('%B %d, %Y')} ♥"
-    story_elements.append(Paragraph(footer_text, footer_style))
+    story = story_store.get(story_id, current_user.id if current_user.is_authenticated else None)
+    if story is None:
+        return "Story not found", 404
     
-    # Build PDF
-    def add_loving_background(canvas, doc):
-        canvas.saveState()
-        # Very light pink background that won't interfere with text
-        canvas.setFillColor(safe_color('#fef7f9') or Color(0.996, 0.969, 0.976))
-        canvas.rect(0, 0, A4[0], A4[1], fill=1, stroke=0)
-        canvas.restoreState()
-
-    doc.build(story_elements, onFirstPage=add_loving_background, onLaterPages=add_loving_background)
+    # Parse once per story, then stream the cached file; send_file sets Content-Length
+    # and uses sendfile where the server supports it
+    document = document_cache.load(story_id, story['story_text'], story['story_data'])
+    return send_file(export_cache.get_or_write(document, exporter), mimetype=exporter.mimetype, as_attachment=True,
+                     download_name=exporter.filename(document), conditional=True)
+
+@app.route('/s/<share_key>')
+@app.route('/s/<share_key>/<filename>')
+def shared_story(share_key, filename='index.html'):
+    """Serve a published story snapshot straight from disk, no database access"""
+    path = snapshot_store.path(share_key, filename) if filename in SNAPSHOT_FILES else None
+    if path is None:
+        return "Story not found", 404
     
-    # Get PDF content
-    pdf_content = buffer.getvalue()
-    buffer.close()
+    gzip_path = snapshot_store.path(share_key, 'index.html.gz') if filename == 'index.html' else None
+    if gzip_path and request.accept_encodings['gzip']:
+        response = send_file(gzip_path, mimetype='text/html', conditional=True)
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = send_file(path, conditional=True)
     
-    # Create response
-    from flask import Response
-    response = Response(pdf_content, mimetype='application/pdf')
-    response.headers['Content-Disposition'] = f'attachment; filename=told_with_love_{story_id}.pdf'
+    # Snapshots never change, and every publish gets a new random share key
+    response.headers['Cache-Control'] = f'public, max-age={SHARE_MAX_AGE}, immutable'
+    response.vary.add('Accept-Encoding')
     return response
 
+def _is_admin_request():
+    """Check the request carries the ADMIN_TOKEN bearer token"""
+    expected = config.admin_token
+    provided = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+    return bool(expected) and hmac.compare_digest(provided, expected)
+
+@app.route('/admin/queue')
+def admin_queue_metrics():
+    """Generation queue depth and wait times per plan tier"""
+    if not _is_admin_request():
+        return jsonify({'error': 'Not found'}), 404
+    return jsonify(generation_queue.metrics())
+
+@app.route('/admin/startup')
+def admin_startup_report():
+    """Startup phase timings and dependencies imported on first use"""
+    if not _is_admin_request():
+        return jsonify({'error': 'Not found'}), 404
+    return jsonify(startup_report.report())
+
 @app.route('/health')
 def health_check():
     """Health check endpoint"""
     return jsonify({'status': 'healthy', 'service': 'love_story_generator'})
 
+def _process_stripe_event(event_id):
+    """Billing job: apply one recorded Stripe event"""
+    if not payment_processor.process_event(event_id):
+        raise RuntimeError(f'Failed to process Stripe event {event_id}')
+    return {'event_id': event_id}
+
 @app.route('/webhook/stripe', methods=['POST'])
 def stripe_webhook():
-    """Handle Stripe webhook events"""
+    """Handle Stripe webhook events: verify, record and acknowledge, then process in the background"""
     payload = request.get_data()
     sig_header = request.headers.get('Stripe-Signature', '')
     
-    payment_processor = PaymentProcessor()
-    
-    if payment_processor.handle_webhook(payload, sig_header):
-        return jsonify({'status': 'success'}), 200
-    else:
+    try:
+        event = payment_processor.construct_event(payload, sig_header)
+    except Exception as e:
+        print(f"Error verifying Stripe webhook: {e}")
         return jsonify({'status': 'error'}), 400
-
-# In-memory storage for stories (use a database in production)
-story_storage = {}
+    
+    if not payment_processor.record_event(event):
+        # Replayed or duplicate delivery; retry events that failed or never ran,
+        # applying an event is a no-op once it is processed
+        if payment_processor.is_unprocessed(event['id']):
+            billing_queue.submit(_process_stripe_event, event['id'])
+            return jsonify({'status': 'retried'}), 200
+        return jsonify({'status': 'duplicate'}), 200
+    
+    billing_queue.submit(_process_stripe_event, event['id'])
+    return jsonify({'status': 'success'}), 200
+
+@app.cli.command('db-upgrade')
+def db_upgrade_command():
+    """Create missing tables and apply pending schema migrations"""
+    applied = upgrade_database()
+    print(f"Database up to date ({len(applied)} migrations applied)")
+
+@app.cli.command('backfill-story-text')
+def backfill_story_text_command():
+    """Compress story text stored before compression was enabled"""
+    converted = backfill_story_text()
+    print(f"Compressed {converted} stories")
+
+@app.cli.command('reconcile-subscriptions')
+@click.option('--dry-run', is_flag=True, help='Report corrections without writing them')
+@click.option('--api-base', default=None, help='Stripe API base URL, e.g. a local stripe-mock')
+def reconcile_subscriptions_command(dry_run, api_base):
+    """Correct user plans that drifted from their Stripe subscriptions"""
+    stats = reconcile_subscriptions(dry_run=dry_run, api_base=api_base)
+    action = 'would correct' if dry_run else 'corrected'
+    print(f"Checked {stats['users_checked']} users against {stats['subscriptions']} subscriptions, "
+          f"{action} {stats['corrected']} ({stats['downgraded']} downgraded to free, "
+          f"{stats['linked']} linked to their subscription)")
+
+# Modules that would otherwise load on first use, e.g. before a server forks workers
+startup_report.preload(config.preload_modules)
+startup_report.mark('routes')
+if __name__ != '__main__':
+    # Imported by a WSGI server, which serves as soon as the import returns
+    startup_report.mark_ready()
 
 if __name__ == '__main__':
     print("Starting Love Story Generator Web Server...")
     print("Webhook endpoint: http://localhost:3000/webhook/tally")
     print("Health check: http://localhost:3000/health")
     
-    # Create database tables
+    # Create database tables and apply pending migrations
     with app.app_context():
-        db.create_all()
+        upgrade_database()
         print("Database initialized")
+        
+        # Resume Stripe events that were acknowledged but not processed, or failed, before a restart
+        for event_id in payment_processor.pending_event_ids():
+            billing_queue.submit(_process_stripe_event, event_id)
+    startup_report.mark('migrations')
     
     # Get port from environment variable (Railway sets this)
     port = int(os.environ.get('PORT', 3000))
     
+    startup_report.mark_ready()
+    print(f"Started in {startup_report.report()['ready_ms']} ms")
+    
+    # Plans use the environment's prices until Stripe answers; SIGHUP refreshes them again.
+    # Neither blocks the server, which starts listening right away
+    reload_plan_catalog_in_background()
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, lambda signum, frame: reload_plan_catalog_in_background())
+    
     # Run in production mode on Railway
     app.run(debug=False, host='0.0.0.0', port=port) 
\ No newline at end of file